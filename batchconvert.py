@@ -0,0 +1,64 @@
+import contextlib
+import csv
+import glob
+import io
+import os
+import time
+
+# Batch mode for the main scripts: converts every MIDI file in a folder (or matching a glob) on a pool
+# of worker processes, one file per task. A file that fails is reported and the rest keep going.
+# The process pool is only set up when a batch runs, a single file doesn't pay for loading it.
+
+SUMMARY_FILE_NAME = "batch_summary.csv"  # Per-file results, written next to where the script is run
+
+
+def find_midi_files(path):
+    if os.path.isdir(path):
+        path = os.path.join(path, "*.mid")
+    return sorted(glob.glob(path))
+
+
+def convert_quietly(convert, midi_file):
+    # Runs in a worker, the scripts' own progress prints would get mixed up between files
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        output_file = convert(midi_file)
+    return output_file, time.perf_counter() - start
+
+
+def run_batch(convert, path, workers=None, summary_file=SUMMARY_FILE_NAME):
+    """Convert every MIDI file found at path with convert(midi_file) -> output file name.
+
+    Returns the number of files that failed.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    midi_files = find_midi_files(path)
+    if not midi_files:
+        print(f"No MIDI files found for '{path}'.")
+        return 0
+
+    print(f"Converting {len(midi_files)} MIDI files with {workers or os.cpu_count()} worker processes...")
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convert_quietly, convert, midi_file): midi_file for midi_file in midi_files}
+        for done, future in enumerate(as_completed(futures), 1):
+            midi_file = futures[future]
+            try:
+                output_file, seconds = future.result()
+                results[midi_file] = ("ok", output_file, f"{seconds:.2f}")
+                print(f"[{done}/{len(midi_files)}] {midi_file} -> {output_file} ({seconds:.2f}s)")
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                results[midi_file] = ("error", error, "")
+                print(f"[{done}/{len(midi_files)}] {midi_file} failed: {error}")
+
+    with open(summary_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["midi_file", "status", "output_or_error", "seconds"])
+        for midi_file in midi_files:
+            writer.writerow([midi_file, *results[midi_file]])
+
+    failed = sum(1 for status, _, _ in results.values() if status != "ok")
+    print(f"Batch done: {len(midi_files) - failed} converted, {failed} failed. Summary written to {summary_file}")
+    return failed
@@ -0,0 +1,241 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import argparse
+import mido
+import numpy as np
+
+# Times every stage of a conversion on synthetic MIDI files, so changes can be compared across commits.
+# The generated files are random but the same for the same settings and seed. Each stage is run
+# REPEAT times for the best wall time, then once more under tracemalloc for its peak memory.
+# Results go to a JSON file, compare two of them with --compare. The start-up time of the scripts is
+# measured too: every script is imported in a fresh interpreter, and must stay under STARTUP_TARGET on
+# top of the interpreter's own start without loading the modules in LAZY_MODULES (--startup checks
+# only that, and fails if it doesn't hold).
+
+REPEAT = 3  # Timed runs per stage, the fastest one counts
+NOTE_LOW, NOTE_HIGH = 21, 108  # Notes the generator picks from (the 88 piano keys)
+MIN_NOTE_SECONDS = 0.05  # Shortest note (and time between notes in a voice) the generator makes, at 120 bpm
+RESULTS_FILE_NAME = "benchmark_{commit}.json"  # Default results file, {commit} is the current git commit
+STARTUP_MODULES = ("miditoroll", "miditoorgan", "multiroll", "checkoverlap", "sustainadd")  # Scripts timed for start-up
+STARTUP_TARGET = 0.15  # Most seconds importing a script may add to the interpreter's start-up
+LAZY_MODULES = ("numpy", "mido", "svgwrite", "pretty_midi", "multiprocessing")  # Must not be loaded just by importing a script
+
+def track_from_events(events):
+    """MidiTrack from (absolute tick, priority, message) events, at the same tick lower priority goes first."""
+    track = mido.MidiTrack()
+    previous = 0
+    for tick, _, msg in sorted(events, key=lambda event: (event[0], event[1])):
+        track.append(msg.copy(time=tick - previous))
+        previous = tick
+    return track
+
+def synthetic_midi(filename, minutes=3, polyphony=4, density=8, tempo_changes=0, sustain=0, seed=0, ticks_per_beat=480):
+    """Write a random MIDI file and return its number of notes.
+
+    polyphony is the number of voices (one track each with its own range of notes, so no note sounds
+    twice at once and gets cut short), density the number of notes started per second over all voices,
+    tempo_changes the number of random set_tempo messages and sustain the number of sustain pedal
+    presses per minute. Lengths are at 120 bpm. No note is shorter than MIN_NOTE_SECONDS, the shortest
+    note sets the scale of the whole roll.
+    """
+    rng = np.random.default_rng(seed)
+    ticks_per_second = ticks_per_beat * 2  # At 120 bpm
+    length = int(minutes * 60 * ticks_per_second)
+    min_ticks = max(int(MIN_NOTE_SECONDS * ticks_per_second), 1)
+    midi = mido.MidiFile(type=1, ticks_per_beat=ticks_per_beat)
+
+    # Tempo track
+    events = [(0, 0, mido.MetaMessage('set_tempo', tempo=500000))]
+    for tick, tempo in zip(rng.integers(1, length, tempo_changes).tolist(), rng.integers(300000, 1000000, tempo_changes).tolist()):
+        events.append((tick, 0, mido.MetaMessage('set_tempo', tempo=tempo)))
+    midi.tracks.append(track_from_events(events))
+
+    note_count = 0
+    note_gap = polyphony / density * ticks_per_second  # Average ticks from one note to the next in a voice
+    voice_notes = np.linspace(NOTE_LOW, NOTE_HIGH + 1, polyphony + 1).astype(np.int64)  # Lowest note of every voice
+    for voice in range(polyphony):
+        # Notes in a voice are at least min_ticks apart, so the shortest notes still fit before the next one
+        gaps = min_ticks + rng.exponential(max(note_gap - min_ticks, 1), int(length / note_gap * 1.5) + 1)
+        starts = np.unique(np.cumsum(gaps).astype(np.int64))
+        starts = starts[starts < length - min_ticks]
+        durations = np.maximum(min_ticks, (np.diff(np.append(starts, length)) * rng.uniform(0.3, 1, len(starts))).astype(np.int64))
+        pitches = rng.integers(voice_notes[voice], max(voice_notes[voice + 1], voice_notes[voice] + 1), len(starts))
+        velocities = rng.integers(30, 110, len(starts))
+
+        events = []
+        for start, duration, pitch, velocity in zip(starts.tolist(), durations.tolist(), pitches.tolist(), velocities.tolist()):
+            events.append((start, 1, mido.Message('note_on', note=pitch, velocity=velocity)))
+            events.append((start + duration, 0, mido.Message('note_off', note=pitch)))
+        note_count += len(starts)
+
+        # Sustain pedal in the first voice, down for most of each press
+        if voice == 0 and sustain:
+            period = 60 * ticks_per_second / sustain
+            for down in np.arange(0, length, period).astype(np.int64).tolist():
+                events.append((down, 0, mido.Message('control_change', control=64, value=127)))
+                events.append((down + int(period * 0.7), 0, mido.Message('control_change', control=64, value=0)))
+        midi.tracks.append(track_from_events(events))
+
+    midi.save(filename)
+    return note_count
+
+def run_stage(function, repeat=REPEAT):
+    """Best wall time of repeat runs and the peak traced memory of one more, plus the last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {"seconds": best, "peak_memory": peak}
+
+def benchmark_case(work_dir, repeat=REPEAT, **settings):
+    """Generate a file with the settings and time every stage on it."""
+    import miditoroll
+    import rollengine
+    import checkoverlap
+    import sustainadd
+
+    name = "_".join(f"{key}{value}" for key, value in settings.items())
+    midi_file = os.path.join(work_dir, name + ".mid")
+    svg_file = os.path.join(work_dir, name + ".svg")
+    sustain_file = os.path.join(work_dir, name + "_sustain.mid")
+    note_count = synthetic_midi(midi_file, **settings)
+
+    stages = {}
+    (notes, min_duration), stages["parse"] = run_stage(lambda: miditoroll.midi_to_piano_roll(midi_file), repeat)
+    geometry, stages["geometry"] = run_stage(lambda: rollengine.roll_geometry(notes, min_duration, miditoroll.PROFILE, miditoroll.OPTIONS), repeat)
+    _, stages["svg"] = run_stage(lambda: rollengine.geometry_to_svg(geometry, svg_file, miditoroll.OPTIONS), repeat)
+    stages["svg"]["output_size"] = os.path.getsize(svg_file)
+    _, stages["checkoverlap"] = run_stage(lambda: checkoverlap.find_overlapping_notes(midi_file), repeat)
+    _, stages["sustainadd"] = run_stage(lambda: sustainadd.add_sustain_note_with_controls(midi_file, sustain_file), repeat)
+    stages["sustainadd"]["output_size"] = os.path.getsize(sustain_file)
+
+    return {
+        "name": name,
+        "settings": settings,
+        "midi_size": os.path.getsize(midi_file),
+        "notes": note_count,
+        "holes": len(geometry.holes[0]),
+        "stages": stages,
+    }
+
+def python_start(code):
+    """Seconds to start a fresh interpreter and run code in it, and what it printed."""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return time.perf_counter() - start, output
+
+def startup_times(repeat=REPEAT):
+    """Import time of every script in STARTUP_MODULES over a bare interpreter start, and the lazy modules it loaded."""
+    baseline = min(python_start("pass")[0] for _ in range(repeat))
+    results = {"interpreter_seconds": baseline, "target_seconds": STARTUP_TARGET, "modules": {}}
+    for module in STARTUP_MODULES:
+        code = f"import sys, {module}; print(' '.join(name for name in {LAZY_MODULES!r} if name in sys.modules))"
+        runs = [python_start(code) for _ in range(repeat)]
+        seconds = min(seconds for seconds, _ in runs) - baseline
+        loaded = runs[0][1].split()
+        results["modules"][module] = {"seconds": seconds, "lazy_modules_loaded": loaded, "ok": seconds <= STARTUP_TARGET and not loaded}
+    return results
+
+def print_startup(results):
+    print(f"Start-up over a bare interpreter ({results['interpreter_seconds']:.3f}s), target {results['target_seconds']:.3f}s:")
+    for module, result in results["modules"].items():
+        loaded = f", loads {', '.join(result['lazy_modules_loaded'])}" if result["lazy_modules_loaded"] else ""
+        print(f"  {module:<13} {result['seconds']:8.3f}s{loaded}{'' if result['ok'] else '  TOO SLOW'}")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old_file, new_file):
+    """Print the time of every stage in two result files side by side."""
+    with open(old_file) as f:
+        old = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']}")
+    old_cases = {case["name"]: case for case in old["cases"]}
+    for case in new["cases"]:
+        if case["name"] not in old_cases:
+            continue
+        print(f"{case['name']}:")
+        for stage, result in case["stages"].items():
+            before = old_cases[case["name"]]["stages"].get(stage)
+            if before:
+                ratio = before["seconds"] / result["seconds"] if result["seconds"] else float("inf")
+                print(f"  {stage:<13} {before['seconds']:8.3f}s -> {result['seconds']:8.3f}s  ({ratio:.2f}x)")
+
+    old_startup = old.get("startup", {}).get("modules", {})
+    if old_startup and "startup" in new:
+        print("start-up:")
+        for module, result in new["startup"]["modules"].items():
+            if module in old_startup:
+                print(f"  {module:<13} {old_startup[module]['seconds']:8.3f}s -> {result['seconds']:8.3f}s")
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time every conversion stage on synthetic MIDI files.")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[3], help="length of the generated songs, one case per length (default: %(default)s)")
+    parser.add_argument("--polyphony", type=int, default=4, help="number of voices (default: %(default)s)")
+    parser.add_argument("--density", type=float, default=8, help="notes started per second (default: %(default)s)")
+    parser.add_argument("--tempo-changes", type=int, default=20, help="number of tempo changes (default: %(default)s)")
+    parser.add_argument("--sustain", type=float, default=6, help="sustain pedal presses per minute (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the generator (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timed runs per stage (default: %(default)s)")
+    parser.add_argument("--output", help="results file (default: benchmark_<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files instead of running")
+    parser.add_argument("--startup", action="store_true", help=f"only check the start-up time of the scripts against the {STARTUP_TARGET}s target")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    startup = startup_times(args.repeat)
+    print_startup(startup)
+    if args.startup:
+        sys.exit(0 if all(result["ok"] for result in startup["modules"].values()) else 1)
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "startup": startup,
+        "cases": [],
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        for minutes in args.minutes:
+            case = benchmark_case(work_dir, repeat=args.repeat, minutes=minutes, polyphony=args.polyphony, density=args.density,
+                                  tempo_changes=args.tempo_changes, sustain=args.sustain, seed=args.seed)
+            results["cases"].append(case)
+            print(f"{case['name']}: {case['notes']} notes, {case['holes']} holes")
+            for stage, result in case["stages"].items():
+                size = f", {result['output_size'] / 1024:.0f} kB" if "output_size" in result else ""
+                print(f"  {stage:<13} {result['seconds']:8.3f}s  {result['peak_memory'] / 1024 ** 2:7.1f} MB peak{size}")
+
+    output_file = args.output or RESULTS_FILE_NAME.format(commit=commit or "unknown")
+    with open(output_file, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output_file}")
@@ -1,61 +1,125 @@
-import mido
-import pretty_midi
-from collections import defaultdict
+import heapq
+import json
+import sys
+import argparse
+from collections import namedtuple
+
+# Finds notes that are played again while they are still sounding. The tracks are merged in time order
+# while they are read and times go through the full tempo map. Only the notes that are sounding right
+# now are kept track of, so a file of several hours doesn't need an event list of several hours.
+# mido is only imported once a file is read, so importing this (or asking for --help) is quick.
+
+NOTE_NAMES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")  # Note names from C, octaves start at C
+
+# A stretch of time where a note was sounding more than once, with the tracks that played it
+Overlap = namedtuple("Overlap", ["note", "name", "start_tick", "end_tick", "start_seconds", "end_seconds", "duration_seconds", "tracks"])
 
 def note_number_to_name(note_number):
-    return pretty_midi.note_number_to_name(note_number)
+    """Scientific pitch name, like C4 for MIDI note 60."""
+    return NOTE_NAMES[note_number % 12] + str(note_number // 12 - 1)
+
+def track_events(midi):
+    """Yield (absolute tick, track number, message) for all tracks merged in time order, ties keep track order."""
+    def absolute_ticks(track_number, track):
+        tick = 0
+        for msg in track:
+            tick += msg.time
+            yield tick, track_number, msg
+    return heapq.merge(*(absolute_ticks(i, track) for i, track in enumerate(midi.tracks)), key=lambda event: event[0])
 
 def find_overlapping_notes(midi_file):
+    import mido
+
     midi = mido.MidiFile(midi_file)
-    ticks_per_beat = midi.ticks_per_beat
 
-    # Find first tempo (default to 500000 µs/beat if not set)
-    tempo = 500000
-    for track in midi.tracks:
-        for msg in track:
-            if msg.type == 'set_tempo':
-                tempo = msg.tempo
-                break
-
-    # Build global list of (absolute_tick, msg) from all tracks
-    merged_events = []
-    for track in midi.tracks:
-        abs_tick = 0
-        for msg in track:
-            abs_tick += msg.time
-            if msg.type in ['note_on', 'note_off']:
-                merged_events.append((abs_tick, msg))
-
-    # Sort by absolute tick
-    merged_events.sort(key=lambda x: x[0])
-
-    # Track overlapping notes
-    active_notes = defaultdict(int)
-    overlapping_info = []
-
-    for abs_tick, msg in merged_events:
-        if msg.type == 'note_on' and msg.velocity > 0:
-            active_notes[msg.note] += 1
-            if active_notes[msg.note] > 1:
-                time_sec = mido.tick2second(abs_tick, ticks_per_beat, tempo)
-                overlapping_info.append((abs_tick, time_sec, msg.note, note_number_to_name(msg.note)))
-        else:  # note_off or note_on with velocity 0
-            active_notes[msg.note] -= 1
-
-    return overlapping_info
-
-# Prompt user
-midi_path = input("Enter the name of the MIDI file (excluding .mid extension): ") + ".mid"
-overlaps = find_overlapping_notes(midi_path)
-
-# Display results
-if overlaps:
-    print("Overlapping notes detected:")
-    for tick, seconds, note_num, note_name in overlaps:
-        minutes = int(seconds // 60)
-        secs = seconds % 60
-        time_str = f"{minutes}m {secs:.3f}s" if minutes > 0 else f"{secs:.3f}s"
-        print(f"- Tick: {tick}, Time: {time_str}, Note: {note_name} (MIDI {note_num})")
-else:
-    print("No overlapping notes found.")
+    # Time is kept in microseconds * ticks_per_beat so it stays exact through tempo changes
+    time_divisor = 1000000 * midi.ticks_per_beat
+    tempo = 500000  # Default tempo until the first set_tempo
+    tempo_tick = 0
+    tempo_time = 0
+    tick = elapsed = 0
+
+    sounding = {}  # Note -> tracks of the note_ons still sounding, oldest first
+    open_overlaps = {}  # Note -> (start tick, start time, tracks involved)
+    overlaps = []
+
+    def close(note, end_tick, end_time):
+        start_tick, start_time, tracks = open_overlaps.pop(note)
+        overlaps.append(Overlap(
+            note=note,
+            name=note_number_to_name(note),
+            start_tick=start_tick,
+            end_tick=end_tick,
+            start_seconds=start_time / time_divisor,
+            end_seconds=end_time / time_divisor,
+            duration_seconds=(end_time - start_time) / time_divisor,
+            tracks=sorted(tracks),
+        ))
+
+    for tick, track_number, msg in track_events(midi):
+        # Elapsed time at this tick using the tempo map so far
+        elapsed = tempo_time + (tick - tempo_tick) * tempo
+        if msg.type == 'set_tempo':
+            tempo, tempo_tick, tempo_time = msg.tempo, tick, elapsed
+        elif msg.type == 'note_on' and msg.velocity > 0:
+            tracks = sounding.setdefault(msg.note, [])
+            tracks.append(track_number)
+            if len(tracks) == 2:
+                open_overlaps[msg.note] = (tick, elapsed, set(tracks))
+            elif len(tracks) > 2:
+                open_overlaps[msg.note][2].add(track_number)
+        elif msg.type in ('note_on', 'note_off'):  # note_off or note_on with velocity 0
+            tracks = sounding.get(msg.note)
+            if tracks:
+                # A note_off ends the note started on its own track if there is one
+                tracks.remove(track_number if track_number in tracks else tracks[0])
+                if len(tracks) == 1:
+                    close(msg.note, tick, elapsed)
+
+    # Overlaps that are still going at the end of the file last until the end
+    for note in list(open_overlaps):
+        close(note, tick, elapsed)
+
+    overlaps.sort(key=lambda overlap: (overlap.start_tick, overlap.note))
+    return overlaps
+
+def format_time(seconds):
+    minutes = int(seconds // 60)
+    secs = seconds % 60
+    return f"{minutes}m {secs:.3f}s" if minutes > 0 else f"{secs:.3f}s"
+
+def print_overlaps(overlaps):
+    if overlaps:
+        print("Overlapping notes detected:")
+        for overlap in overlaps:
+            tracks = ", ".join(str(track) for track in overlap.tracks)
+            print(f"- Tick: {overlap.start_tick}-{overlap.end_tick}, Time: {format_time(overlap.start_seconds)} for {overlap.duration_seconds:.3f}s, "
+                  f"Note: {overlap.name} (MIDI {overlap.note}), Tracks: {tracks}")
+    else:
+        print("No overlapping notes found.")
+
+def overlap_report(midi_file):
+    """Overlaps of one file as a dict for the JSON report, a file that can't be read gets an error instead."""
+    try:
+        return {"midi_file": midi_file, "overlaps": [overlap._asdict() for overlap in find_overlapping_notes(midi_file)]}
+    except Exception as e:
+        return {"midi_file": midi_file, "error": f"{type(e).__name__}: {e}"}
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find notes in MIDI files that are played again while they are still sounding.")
+    parser.add_argument("midi_files", nargs="*", help="MIDI files to check (asks for one if none are given)")
+    parser.add_argument("--json", action="store_true", help="print a JSON report for all files instead of a list")
+    args = parser.parse_args()
+
+    midi_files = args.midi_files or [input("Enter the name of the MIDI file (excluding .mid extension): ") + ".mid"]
+    if args.json:
+        report = [overlap_report(midi_file) for midi_file in midi_files]
+        print(json.dumps(report, indent=2))
+        sys.exit(1 if any("error" in entry for entry in report) else 0)
 
+    for midi_file in midi_files:
+        if len(midi_files) > 1:
+            print(f"{midi_file}:")
+        print_overlaps(find_overlapping_notes(midi_file))
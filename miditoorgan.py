@@ -1,10 +1,8 @@
-import mido
-import numpy as np
-from svgwrite import Drawing
-import os
+import rollengine
+import rollcli
+from rollengine import InstrumentProfile, OutputOptions
 
 # Configuration variables
-MIDI_FILE_NAME = input("Enter the name of the MIDI file (excluding .mid extension): ") + ".mid"  # Name of the MIDI file
 BLANK_SPACE_MM = 110  # Blank spaces at beginning
 BLANK_SPACE_END_MM = 110  # Blank space at the end in mm
 
@@ -15,6 +13,19 @@ CUT_LINE_SEGMENT_LENGTH = 15  # Length of each cut line segment in mm
 CUT_LINE_SEGMENT_GAP = 0.3  # Gap between cut line segments in mm
 HORIZONTAL_CUT_LINES = True  # Toggle for horizontal cutting lines
 DOUBLE_CUT = True  # Ensure the knife goes over each hole twice
+CHECK_RUNS = False  # Also run the old cell-by-cell note scan and check it draws the same holes
+STREAM_SVG = True  # Write the svg to the file while drawing instead of building it in memory first
+COMPRESS_SVG = False  # Write a gzipped .svgz file instead (only when streaming)
+SVG_STYLE = "rects"  # "rects" for a rect per hole, "paths" for one path per note row or "shapes" to reuse identical holes (smaller files, needs STREAM_SVG)
+TOOLPATH_ORDER = "rows"  # Order the holes are cut in: "rows" (note by note), "serpentine" (back and forth across the roll) or "nearest" (closest hole next)
+TOOLPATH_BAND_MM = 20  # Length of roll covered by each sweep with serpentine ordering
+OUTPUT_FORMAT = "svg"  # "svg", "hpgl" / "gcode" to write straight to a file for the cutter (in real mm), or "png" for a quick preview
+PREVIEW_MM_PER_PIXEL = 0.5  # Resolution of the png preview, smaller is sharper but bigger
+TILE_LENGTH_MM = 0  # Split the roll into sheets this long for the cutter bed, 0 for a single file
+TILE_OVERLAP_MM = 30  # Overlap between sheets, registration marks in the overlap line them up (keep it longer than the longest hole)
+USE_PARSE_CACHE = True  # Reuse the parsed MIDI file from the cache when only svg settings changed
+RENDER_WORKERS = 1  # Processes writing the svg holes of one roll, more is faster for a long roll (same file, svg only, needs STREAM_SVG)
+EXACT_TIMING = False  # Use the file's own timing (the finest grid all note starts and ends are on) instead of rounding to TIME_STEP
 
 # No touching
 TIME_STEP = 0.01  # Time step for MIDI processing in seconds
@@ -24,244 +35,61 @@ BASE_LENGTH_MM = 5  # Base length for scaling the shortest note in mm
 NOTE_VERTICAL_OFFSET = 7.43  # Vertical offset for notes within the two lines (+ is up)
 VERTICAL_GAP = 0.85  # Gap between different notes in mm
 
-def midi_to_piano_roll(midi_file, time_step=TIME_STEP, note_mapping=NOTE_MAPPING):
-    print("Loading MIDI file...")
-    midi = mido.MidiFile(midi_file)
-    total_time = sum([msg.time for msg in midi if not msg.is_meta])
-    num_steps = int(total_time / time_step)
-    roll_matrix = np.zeros((len(note_mapping), num_steps), dtype=int)
+# The organ and its paper, built from the settings above (see rollengine.py)
+PROFILE = InstrumentProfile(
+    name="organ",
+    notes=tuple(NOTE_MAPPING),
+    note_height=NOTE_HEIGHT,
+    base_length_mm=BASE_LENGTH_MM,
+    vertical_gap=VERTICAL_GAP,
+    note_vertical_offset=NOTE_VERTICAL_OFFSET,
+    long_note_threshold=LONG_NOTE_THRESHOLD,
+    bridge_width=BRIDGE_WIDTH,
+    bridge_rounding=None,
+    min_first_part_length=1.5 * NOTE_HEIGHT,
+    note_shortening=2,  # 1mm less on both ends of every hole
+    sustain_note=None,
+    sustain_adjust=1,
+    paper_width=110,
+    blank_space=BLANK_SPACE_MM,
+    blank_space_end=BLANK_SPACE_END_MM,
+    cut_line_segment_length=CUT_LINE_SEGMENT_LENGTH,
+    cut_line_segment_gap=CUT_LINE_SEGMENT_GAP,
+    horizontal_cut_lines=HORIZONTAL_CUT_LINES,
+    output_suffix="_organ",
+)
+
+PARSE_TIME_STEP = None if EXACT_TIMING else TIME_STEP  # None parses with exact timing
+
+OPTIONS = OutputOptions(
+    output_format=OUTPUT_FORMAT,
+    svg_style=SVG_STYLE,
+    stream_svg=STREAM_SVG,
+    compress_svg=COMPRESS_SVG,
+    double_cut=DOUBLE_CUT,
+    toolpath_order=TOOLPATH_ORDER,
+    toolpath_band_mm=TOOLPATH_BAND_MM,
+    tile_length_mm=TILE_LENGTH_MM,
+    tile_overlap_mm=TILE_OVERLAP_MM,
+    check_runs=CHECK_RUNS,
+    render_workers=RENDER_WORKERS,
+    preview_mm_per_pixel=PREVIEW_MM_PER_PIXEL,
+)
+
+def midi_to_piano_roll(midi_file, time_step=PARSE_TIME_STEP, note_mapping=NOTE_MAPPING):
+    """Parse the file and return the notes on the organ roll and the shortest note duration."""
+    profile = PROFILE._replace(notes=tuple(note_mapping))
+    return rollengine.profile_notes(rollengine.parse_midi(midi_file, time_step), profile)
+
+def piano_roll_to_svg(notes, min_duration, filename="organ_roll.svg", **settings):
+    """Write the roll as svg, settings override PROFILE fields (or the old keywords). Returns the names of the files written."""
+    return rollengine.roll_to_svg(notes, min_duration, rollengine.profile_with(PROFILE, settings), OPTIONS, filename)
+
+def piano_roll_to_plotter(notes, min_duration, filename="organ_roll.plt", plotter_format="hpgl", **settings):
+    """Write the roll as HPGL or G-code, returns the names of the files written (registration marks are svg only)."""
+    return rollengine.roll_to_plotter(notes, min_duration, rollengine.profile_with(PROFILE, settings), OPTIONS._replace(output_format=plotter_format), filename)
 
-    print("Processing MIDI events...")
-    current_time = 0
-    active_notes = {}
-    note_durations = []
-
-    for msg in midi:
-        if not msg.is_meta:
-            current_time += msg.time
-            step_index = int(current_time / time_step)
-
-            if msg.type == 'note_on' and msg.velocity > 0:
-                if msg.note in note_mapping:
-                    note_index = note_mapping.index(msg.note)
-                    active_notes[msg.note] = step_index  # Store the start time for this note
-            elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
-                if msg.note in active_notes:
-                    note_index = note_mapping.index(msg.note)
-                    start_index = active_notes.pop(msg.note)
-                    if start_index != step_index:  # Only process notes with nonzero duration
-                        roll_matrix[note_index, start_index:step_index] = 1
-                        duration = step_index - start_index
-                        note_durations.append(duration)
-
-
-    min_duration = min(note_durations) if note_durations else 1
-    print("MIDI file successfully processed.")
-    return roll_matrix, min_duration
-
-def piano_roll_to_svg(matrix, min_duration, filename="piano_roll.svg", note_height=NOTE_HEIGHT, base_length_mm=BASE_LENGTH_MM, vertical_gap=VERTICAL_GAP, note_vertical_offset=NOTE_VERTICAL_OFFSET, long_note_threshold=LONG_NOTE_THRESHOLD, bridge_width_mm=BRIDGE_WIDTH):
-    # Scaling factor to correct dimensions
-    scaling_factor = 2.82  # Scale to achieve accurate 2mm hole size in Illustrator
-
-    # Adjust all measurements by scaling factor
-    scaled_note_height = note_height * scaling_factor
-    scaled_base_length_mm = base_length_mm * scaling_factor
-    scaled_vertical_gap = vertical_gap * scaling_factor
-    scaled_note_vertical_offset = note_vertical_offset * scaling_factor
-    scaled_blank_space_mm = BLANK_SPACE_MM * scaling_factor
-    scaled_blank_space_end_mm = BLANK_SPACE_END_MM * scaling_factor
-    scaled_long_note_threshold = long_note_threshold * scaling_factor
-    scaled_bridge_width = bridge_width_mm * scaling_factor  # Configurable bridge width
-    min_first_part_length = 1.5 * note_height * scaling_factor  # Minimum first part length
-
-    note_width_scaling_factor = scaled_base_length_mm / min_duration  # Adjusted scale based on shortest note
-
-    rows, cols = matrix.shape
-    total_height = (cols * note_width_scaling_factor) + scaled_blank_space_mm + scaled_blank_space_end_mm
-    total_width = (rows * scaled_note_height) + (rows - 1) * scaled_vertical_gap + (110 * scaling_factor) + 10 * scaling_factor
-
-    dwg = Drawing(filename, size=(total_width, total_height))
-
-    # Add a root group to hold all elements for easier transformations
-    root_group = dwg.g()
-
-    # Define cut line positions
-    cut_line_x = 5 * scaling_factor  # Position for the left cut line
-    right_cut_line_x = cut_line_x + (110 * scaling_factor)  # Position for the right cut line, 110mm to the right
-
-    # Convert segment length and gap to scaled values
-    scaled_cut_line_segment_length = CUT_LINE_SEGMENT_LENGTH * scaling_factor
-    scaled_cut_line_segment_gap = CUT_LINE_SEGMENT_GAP * scaling_factor
-
-    # Draw the left segmented cut line
-    current_y = 0
-    while current_y < total_height:
-        segment_end = min(current_y + scaled_cut_line_segment_length, total_height)
-        root_group.add(dwg.line(
-            start=(cut_line_x, current_y),
-            end=(cut_line_x, segment_end),
-            stroke='red',
-            stroke_width=1
-        ))
-        current_y = segment_end + scaled_cut_line_segment_gap
-
-    # Draw the right segmented cut line
-    current_y = 0
-    while current_y < total_height:
-        segment_end = min(current_y + scaled_cut_line_segment_length, total_height)
-        root_group.add(dwg.line(
-            start=(right_cut_line_x, current_y),
-            end=(right_cut_line_x, segment_end),
-            stroke='red',
-            stroke_width=1
-        ))
-        current_y = segment_end + scaled_cut_line_segment_gap
-
-    # Draw horizontal cutting lines if enabled
-    if HORIZONTAL_CUT_LINES:
-        current_x = cut_line_x
-        while current_x <= right_cut_line_x:
-            segment_end_x = min(current_x + scaled_cut_line_segment_length, right_cut_line_x)
-            root_group.add(dwg.line(
-                start=(current_x, 0),
-                end=(segment_end_x, 0),
-                stroke='red',
-                stroke_width=1
-            ))
-            current_x = segment_end_x + scaled_cut_line_segment_gap
-
-        current_x = cut_line_x
-        while current_x <= right_cut_line_x:
-            segment_end_x = min(current_x + scaled_cut_line_segment_length, right_cut_line_x)
-            root_group.add(dwg.line(
-                start=(current_x, total_height),
-                end=(segment_end_x, total_height),
-                stroke='red',
-                stroke_width=1
-            ))
-            current_x = segment_end_x + scaled_cut_line_segment_gap
-
-    # Draw notes with vertical offset for blank space at the beginning
-    for row in range(rows):
-        col_start = None
-        for col in range(cols):
-            if matrix[row, col] == 1:
-                if col_start is None:
-                    col_start = col
-            elif col_start is not None:
-                y = (col_start * note_width_scaling_factor) + scaled_blank_space_mm
-                # Adjust the x-position to start 1mm later (to account for 1mm less on both sides)
-                x = row * (scaled_note_height + scaled_vertical_gap) + scaled_note_vertical_offset + 1 * scaling_factor
-                duration_height = (col - col_start) * note_width_scaling_factor
-
-                # Reduce the width of the note by 2mm (1mm from both sides)
-                reduced_duration_height = duration_height - 2 * scaling_factor
-
-                # Split long notes into multiple parts if needed
-                if reduced_duration_height > scaled_long_note_threshold:
-                    remaining_duration = reduced_duration_height
-                    parts = []
-
-                    # Break into full segments first
-                    while remaining_duration > scaled_long_note_threshold + scaled_bridge_width:
-                        parts.append(scaled_long_note_threshold)
-                        remaining_duration -= scaled_long_note_threshold + scaled_bridge_width
-
-                    # Ensure the first part is at least 3 mm
-                    if remaining_duration < min_first_part_length:
-                        # Merge the first part with the next part if too short
-                        if parts:
-                            parts[0] += remaining_duration + scaled_bridge_width
-                        else:
-                            parts.append(remaining_duration)  # If no other parts, use remaining duration
-                        remaining_duration = 0
-                    else:
-                        # Add remaining duration as the first part
-                        parts.insert(0, remaining_duration)
-
-                    # Draw all parts
-                    current_y = y
-                    for part in parts:
-                        for _ in range(2 if DOUBLE_CUT else 1):  # Draw each part twice if double cut is enabled
-                            root_group.add(dwg.rect(insert=(right_cut_line_x - x - scaled_note_height, total_height - current_y - part), 
-                                                     size=(scaled_note_height, part), 
-                                                     fill="black", 
-                                                     rx=scaled_note_height / 2, 
-                                                     ry=scaled_note_height / 2))
-                        current_y += part + scaled_bridge_width
-                else:
-                    # Regular note: no circles, just a rectangle with reduced width
-                    for _ in range(2 if DOUBLE_CUT else 1):  # Draw each note twice if double cut is enabled
-                        root_group.add(dwg.rect(insert=(right_cut_line_x - x - scaled_note_height, total_height - y - reduced_duration_height), 
-                                                 size=(scaled_note_height, reduced_duration_height), 
-                                                 fill="black",
-                                                 rx=scaled_note_height / 2, 
-                                                 ry=scaled_note_height / 2))
-                col_start = None
-
-        # Handle the last note in the column
-        if col_start is not None:
-            y = (col_start * note_width_scaling_factor) + scaled_blank_space_mm
-            x = row * (scaled_note_height + scaled_vertical_gap) + scaled_note_vertical_offset + 1 * scaling_factor
-            duration_height = (cols - col_start) * note_width_scaling_factor
-
-            # Reduce the width of the note by 2mm (1mm from both sides)
-            reduced_duration_height = duration_height - 2 * scaling_factor
-
-            if reduced_duration_height > scaled_long_note_threshold:
-                remaining_duration = reduced_duration_height
-                parts = []
-
-                # Break into full segments first
-                while remaining_duration > scaled_long_note_threshold + scaled_bridge_width:
-                    parts.append(scaled_long_note_threshold)
-                    remaining_duration -= scaled_long_note_threshold + scaled_bridge_width
-
-                # Ensure the first part is at least 3 mm
-                if remaining_duration < min_first_part_length:
-                    # Merge the first part with the next part if too short
-                    if parts:
-                        parts[0] += remaining_duration + scaled_bridge_width
-                    else:
-                        parts.append(remaining_duration)  # If no other parts, use remaining duration
-                    remaining_duration = 0
-                else:
-                    # Add remaining duration as the first part
-                    parts.insert(0, remaining_duration)
-
-                # Draw all parts
-                current_y = y
-                for part in parts:
-                    for _ in range(2 if DOUBLE_CUT else 1):  # Draw each part twice if double cut is enabled
-                        root_group.add(dwg.rect(insert=(right_cut_line_x - x - scaled_note_height, total_height - current_y - part), 
-                                                 size=(scaled_note_height, part), 
-                                                 fill="black", 
-                                                 rx=scaled_note_height / 2, 
-                                                 ry=scaled_note_height / 2))
-                    current_y += part + scaled_bridge_width
-            else:
-                for _ in range(2 if DOUBLE_CUT else 1):  # Draw each note twice if double cut is enabled
-                    root_group.add(dwg.rect(insert=(right_cut_line_x - x - scaled_note_height, total_height - y - reduced_duration_height), 
-                                             size=(scaled_note_height, reduced_duration_height), 
-                                             fill="black",
-                                             rx=scaled_note_height / 2, 
-                                             ry=scaled_note_height / 2))
-
-    # Apply mirroring to the root group
-    root_group.translate(total_width, 0)  # Translate content to the right edge
-    root_group.scale(-1, 1)  # Mirror horizontally
-
-    # Add the root group to the SVG
-    dwg.add(root_group)
-    dwg.save()
-    print(f"SVG file '{filename}' created successfully.")
 
 # Main execution
-try:
-    print("Generating organ roll...")
-    piano_roll, min_duration = midi_to_piano_roll(MIDI_FILE_NAME)
-    svg_file_name = os.path.splitext(MIDI_FILE_NAME)[0] + "_organ.svg"
-    piano_roll_to_svg(piano_roll, min_duration, filename=svg_file_name)
-    print("Script completed successfully.")
-except Exception as e:
-    print(f"An error occurred: {e}")
+if __name__ == "__main__":
+    rollcli.main("Turn MIDI files into organ roll svgs.", {PROFILE.name: PROFILE}, OPTIONS, PARSE_TIME_STEP, USE_PARSE_CACHE, "organ roll")
@@ -0,0 +1,20 @@
+import rollcli
+import miditoroll
+import miditoorgan
+
+# Turns a MIDI file into rolls for several instruments at once, the file is only parsed once.
+# Every instrument uses the settings at the top of its own script.
+
+PROFILES = {
+    "piano": miditoroll.PROFILE,
+    "organ": miditoorgan.PROFILE,
+}
+
+TIME_STEP = miditoroll.PARSE_TIME_STEP  # Parse settings are taken from miditoroll.py as well
+OPTIONS = miditoroll.OPTIONS  # Output settings are taken from miditoroll.py
+USE_PARSE_CACHE = miditoroll.USE_PARSE_CACHE
+
+
+# Main execution
+if __name__ == "__main__":
+    rollcli.main("Turn MIDI files into rolls for several instruments from one parse.", PROFILES, OPTIONS, TIME_STEP, USE_PARSE_CACHE, "rolls")
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import zipfile
+
+# On-disk cache for parsed MIDI data, so re-rendering after a config tweak doesn't parse the file again.
+# Entries are .npz files named after a hash of the MIDI file contents and the settings used to parse it.
+# The later stages of the conversion (see rollengine.py) are cached the same way, under derived keys.
+# The least recently used entries are deleted once the cache grows past CACHE_MAX_BYTES. numpy is only
+# imported to read or write an entry, hashing a file (watchfolder.py) doesn't need it.
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rollcache")
+CACHE_MAX_BYTES = 200 * 1024 * 1024  # Size limit for all cached entries together
+CACHE_VERSION = 1  # Bump when the parser output changes so old entries stop matching
+
+
+def file_digest(midi_file):
+    """sha256 of the file contents, for telling files apart by what is in them."""
+    digest = hashlib.sha256()
+    with open(midi_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest
+
+
+def file_hash(midi_file):
+    return file_digest(midi_file).hexdigest()
+
+
+def cache_key(midi_file, *settings):
+    """Hash of the MIDI file contents plus the parse settings (time step, note range or mapping, ...)."""
+    digest = file_digest(midi_file)
+    digest.update(repr((CACHE_VERSION,) + settings).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def derived_key(key, *settings):
+    """Key for a stage computed from the entry under key with these settings."""
+    return hashlib.sha256(repr((key,) + settings).encode("utf-8")).hexdigest()
+
+
+def load(key, cache_dir=CACHE_DIR):
+    """Return the cached arrays for key as a dict, or None if there is no usable entry."""
+    import numpy as np
+
+    path = os.path.join(cache_dir, key + ".npz")
+    try:
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        os.utime(path)  # Mark as recently used
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+    return arrays
+
+
+def store(key, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, **arrays):
+    import numpy as np
+
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, key + ".npz")
+
+    # Write to a temporary file first so batch workers never see half written entries
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(temp_path, path)
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npz"):
+            try:
+                stat = os.stat(os.path.join(cache_dir, name))
+            except OSError:
+                continue  # Removed by another process in the meantime
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            pass
+        total -= size
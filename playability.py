@@ -0,0 +1,142 @@
+import contextlib
+import io
+import json
+import sys
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from batchconvert import find_midi_files
+import rollengine
+import multiroll
+
+# Finds what won't play on the roll before anything is cut, for screening a whole catalogue at once.
+# Every check is worked out for all notes together from the parsed notes, the same ones the roll is
+# drawn from, with the instrument's own settings:
+#   off_roll           note the instrument has no hole for (outside NOTE_RANGE / NOTE_MAPPING)
+#   zero_length        note that starts and ends in the same time step, it gets no hole
+#   shortened_away     note no longer than the note shortening, it gets no hole either
+#   merged             repeated notes that touch or overlap, they are cut as one hole and play as one
+#   short_repeat_gap   paper between two holes on a row too short for the tracker bar to close
+#   short_hole         hole shorter than the instrument can sound
+#   short_bridge_part  part of a bridged long note shorter than min_first_part_length
+# The thresholds that aren't settings of the instrument itself are in THRESHOLDS below.
+
+# Limits per instrument, in mm
+LintThresholds = namedtuple("LintThresholds", ["min_repeat_gap_mm", "min_hole_length_mm"])
+THRESHOLDS = {
+    "piano": LintThresholds(min_repeat_gap_mm=1.5, min_hole_length_mm=1.5),
+    "organ": LintThresholds(min_repeat_gap_mm=2.5, min_hole_length_mm=2),
+}
+CHECKS = ("off_roll", "zero_length", "shortened_away", "merged", "short_repeat_gap", "short_hole", "short_bridge_part")
+
+
+def lint_notes(notes, profile, thresholds):
+    """Every check for the parsed notes (all MIDI note numbers) on the profile's roll. Returns a report dict."""
+    on_roll = np.isin(notes.rows, profile.notes)
+    zero_length = on_roll & (notes.starts >= notes.ends)
+    table, min_duration = rollengine.profile_notes(notes, profile)
+    step_mm = profile.base_length_mm / min_duration  # Roll length of one time step
+
+    # Runs are what gets cut, notes on a row that touch or overlap become one run
+    runs = rollengine.note_runs(table)
+    rows, starts, ends = runs
+    notes_per_run = np.bincount(rollengine.run_of_notes(table, runs), minlength=len(rows))
+
+    # Paper left between a run and the one before it on the same row, the shortening adds to it
+    gap_mm = np.full(len(rows), np.inf)
+    same_row = rows[1:] == rows[:-1]
+    gap_mm[1:][same_row] = (starts[1:] - ends[:-1])[same_row] * step_mm + profile.note_shortening
+
+    # Holes as hole_geometry cuts them, long notes split into bridged parts
+    length_mm = (ends - starts) * step_mm - profile.note_shortening
+    run_index, part_offset, part_mm = rollengine.split_long_notes(
+        np.zeros(len(rows)), length_mm, profile.long_note_threshold, profile.bridge_width, profile.min_first_part_length)
+    bridged = np.bincount(run_index, minlength=len(rows))[run_index] > 1
+    cut = length_mm[run_index] > 0
+
+    def entries(note_numbers, note_starts, extra=None, offset_mm=0):
+        position_mm = profile.blank_space + note_starts * step_mm + offset_mm
+        found = [{"note": note, "start_step": start, "position_mm": round(position, 1)}
+                 for note, start, position in zip(note_numbers.tolist(), note_starts.tolist(), position_mm.tolist())]
+        for name, values in (extra or {}).items():
+            for entry, value in zip(found, values.tolist()):
+                entry[name] = round(value, 2) if isinstance(value, float) else value
+        return found
+
+    row_notes = np.array(profile.notes, dtype=np.int64)
+    off = ~on_roll
+    short_gap = gap_mm < thresholds.min_repeat_gap_mm
+    away = length_mm <= 0
+    short_hole = cut & ~bridged & (part_mm < thresholds.min_hole_length_mm)
+    short_part = cut & bridged & (part_mm < profile.min_first_part_length)
+    merged = notes_per_run > 1
+    problems = {
+        "off_roll": entries(notes.rows[off], notes.starts[off]),
+        "zero_length": entries(notes.rows[zero_length], notes.starts[zero_length]),
+        "shortened_away": entries(row_notes[rows[away]], starts[away], {"note_mm": length_mm[away] + profile.note_shortening}),
+        "merged": entries(row_notes[rows[merged]], starts[merged], {"notes": notes_per_run[merged]}),
+        "short_repeat_gap": entries(row_notes[rows[short_gap]], starts[short_gap], {"gap_mm": gap_mm[short_gap]}),
+        "short_hole": entries(row_notes[rows[run_index[short_hole]]], starts[run_index[short_hole]], {"length_mm": part_mm[short_hole]}),
+        "short_bridge_part": entries(row_notes[rows[run_index[short_part]]], starts[run_index[short_part]], {"length_mm": part_mm[short_part]},
+                                     part_offset[short_part]),
+    }
+    return {
+        "instrument": profile.name,
+        "notes": len(notes.rows),
+        "runs": len(rows),
+        "holes": int(cut.sum()),
+        "step_mm": round(step_mm, 4),
+        "counts": {check: len(problems[check]) for check in CHECKS},
+        "ok": not any(problems.values()),
+        "problems": problems,
+    }
+
+
+def lint_file(midi_file, instruments=tuple(multiroll.PROFILES), use_cache=multiroll.USE_PARSE_CACHE):
+    """Reports for the MIDI file on every instrument, parsed once (through the parse cache)."""
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            key = rollengine.parse_key(midi_file, multiroll.TIME_STEP) if use_cache else None
+            notes = rollengine.load_midi(midi_file, multiroll.TIME_STEP, key)
+            reports = [lint_notes(notes, multiroll.PROFILES[name], THRESHOLDS[name]) for name in instruments]
+    except Exception as e:
+        return [{"midi_file": midi_file, "ok": False, "error": f"{type(e).__name__}: {e}"}]
+    return [dict(midi_file=midi_file, **report) for report in reports]
+
+
+def print_summary(report):
+    if "error" in report:
+        print(f"{report['midi_file']}: {report['error']}")
+        return
+    found = ", ".join(f"{count} {check}" for check, count in report["counts"].items() if count)
+    print(f"{report['midi_file']} ({report['instrument']}): {found or 'ok'}")
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check MIDI files for notes that won't play on the roll.")
+    parser.add_argument("paths", nargs="+", help="MIDI files, folders or globs to check")
+    parser.add_argument("--instrument", action="append", choices=list(multiroll.PROFILES), help="instrument to check for, can be repeated (default: all)")
+    parser.add_argument("--json", metavar="FILE", help="write the full reports, with every problem note, to FILE")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--no-cache", action="store_true", help="always parse the MIDI files, ignore and don't fill the cache")
+    args = parser.parse_args()
+
+    midi_files = [midi_file for path in args.paths for midi_file in (find_midi_files(path) or [path])]
+    instruments = tuple(args.instrument or multiroll.PROFILES)
+    reports = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for file_reports in pool.map(lint_file, midi_files, [instruments] * len(midi_files),
+                                     [multiroll.USE_PARSE_CACHE and not args.no_cache] * len(midi_files), chunksize=8):
+            for report in file_reports:
+                print_summary(report)
+            reports += file_reports
+
+    failed = sum(1 for report in reports if not report["ok"])
+    print(f"Checked {len(midi_files)} files: {len(reports) - failed} rolls ok, {failed} with problems.")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Reports written to {args.json}")
+    sys.exit(1 if failed else 0)
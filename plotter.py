@@ -0,0 +1,117 @@
+# Writes the roll geometry straight to HPGL or G-code for the cutter, instead of going through the svg.
+# Coordinates are real millimetres (the svg's Illustrator scaling factor is divided out) with the same
+# mirroring as the svg, and y pointing up from the bottom of the sheet like plotters expect. Hole ends
+# are cut as arcs, DOUBLE_CUT goes around each hole again before moving on. x is measured from the
+# roll's left cut line (the paper edge on the cutter), not from the edge of the svg page.
+
+HPGL_UNITS_PER_MM = 40  # Plotter units per mm (HPGL standard is 0.025 mm)
+GCODE_TRAVEL_Z = 3  # Knife height in mm while moving between cuts
+GCODE_CUT_Z = 0  # Knife height in mm while cutting
+GCODE_FEED_RATE = 1500  # Cutting speed in mm/min
+BUFFER_SIZE = 1 << 16  # Write buffer for the output file
+ORIGIN_X_MM = 0  # Where the left cut line of the roll is across the cutter bed, in mm
+
+
+def hole_outline(left, bottom, width, height, radius):
+    """Rounded rect as a start point and (end_x, end_y, centre_x, centre_y) steps, centre None for lines.
+
+    Goes counterclockwise starting at the bottom edge, every arc is a quarter circle. Arcs of a square
+    corner (radius 0) and sides of no length are left out, controllers reject zero-radius arcs.
+    """
+    radius = min(radius, width / 2, height / 2)
+    right, top = left + width, bottom + height
+    start = (left + radius, bottom)
+    sides, ends = width - 2 * radius > 0, height - 2 * radius > 0
+    corners = radius > 0
+    steps = [
+        (sides, (right - radius, bottom, None, None)),
+        (corners, (right, bottom + radius, right - radius, bottom + radius)),
+        (ends, (right, top - radius, None, None)),
+        (corners, (right - radius, top, right - radius, top - radius)),
+        (sides, (left + radius, top, None, None)),
+        (corners, (left, top - radius, left + radius, top - radius)),
+        (ends, (left, bottom + radius, None, None)),
+        (corners, (left + radius, bottom, left + radius, bottom + radius)),
+    ]
+    return start, [step for keep, step in steps if keep]
+
+
+def hpgl_commands(cut_lines, holes, passes):
+    def units(value):
+        return round(value * HPGL_UNITS_PER_MM)
+
+    yield "IN;SP1;PA;\n"
+    for (x1, y1), (x2, y2) in cut_lines:
+        yield f"PU{units(x1)},{units(y1)};PD{units(x2)},{units(y2)};\n"
+    for hole in holes:
+        (start_x, start_y), steps = hole_outline(*hole)
+        commands = [f"PU{units(start_x)},{units(start_y)};PD;"]
+        for _ in range(passes):
+            for end_x, end_y, centre_x, centre_y in steps:
+                if centre_x is None:
+                    commands.append(f"PD{units(end_x)},{units(end_y)};")
+                else:
+                    commands.append(f"AA{units(centre_x)},{units(centre_y)},90;")  # Counterclockwise quarter circle
+        yield "".join(commands) + "\n"
+    yield "PU;SP0;\n"
+
+
+def gcode_commands(cut_lines, holes, passes):
+    def mm(value):
+        return f"{value:.3f}"
+
+    knife_up, knife_down = f"G0 Z{GCODE_TRAVEL_Z}\n", f"G1 Z{GCODE_CUT_Z} F{GCODE_FEED_RATE}\n"
+    yield "G21\nG90\n" + knife_up
+    for (x1, y1), (x2, y2) in cut_lines:
+        yield f"G0 X{mm(x1)} Y{mm(y1)}\n{knife_down}G1 X{mm(x2)} Y{mm(y2)}\n{knife_up}"
+    for hole in holes:
+        (start_x, start_y), steps = hole_outline(*hole)
+        commands = [f"G0 X{mm(start_x)} Y{mm(start_y)}\n", knife_down]
+        for _ in range(passes):
+            current_x, current_y = start_x, start_y
+            for end_x, end_y, centre_x, centre_y in steps:
+                if centre_x is None:
+                    commands.append(f"G1 X{mm(end_x)} Y{mm(end_y)}\n")
+                else:
+                    # G3 is counterclockwise, the centre is given relative to the current position
+                    commands.append(f"G3 X{mm(end_x)} Y{mm(end_y)} I{mm(centre_x - current_x)} J{mm(centre_y - current_y)}\n")
+                current_x, current_y = end_x, end_y
+        commands.append(knife_up)
+        yield "".join(commands)
+    yield "M2\n"
+
+
+def plot_coordinates(geometry):
+    """Cut lines and holes of the geometry in mm, mirrored like the svg and with y up."""
+    scale = geometry.scaling_factor
+
+    # Mirrored, the svg's right cut line is the left one; the page margin beyond it isn't cut
+    vertical_x = [start[0] for start, end in geometry.cut_lines if start[0] == end[0]]
+    mirror_x = max(vertical_x, default=geometry.width) + ORIGIN_X_MM * scale
+
+    def point(x, y):
+        return (mirror_x - x) / scale, (geometry.height - y) / scale
+
+    cut_lines = [(point(*start), point(*end)) for start, end in geometry.cut_lines]
+
+    rect_x, rect_y, width, height, radius = geometry.holes[:5]
+    keep = height > 0
+    left = (mirror_x - rect_x - width) / scale
+    bottom = (geometry.height - rect_y - height) / scale
+    holes = zip(*(values[keep].tolist() for values in (left, bottom, width / scale, height / scale, radius / scale)))
+    return cut_lines, holes
+
+
+def write_plot(filename, geometry, plotter_format, passes=1):
+    """Stream the geometry to filename as "hpgl" or "gcode"."""
+    if plotter_format == "hpgl":
+        commands = hpgl_commands
+    elif plotter_format == "gcode":
+        commands = gcode_commands
+    else:
+        raise ValueError(f"Unknown plotter format '{plotter_format}'")
+
+    cut_lines, holes = plot_coordinates(geometry)
+    with open(filename, "w", buffering=BUFFER_SIZE) as f:
+        for chunk in commands(cut_lines, holes, passes):
+            f.write(chunk)
@@ -0,0 +1,117 @@
+import struct
+import zlib
+import numpy as np
+
+# Quick look at a roll before cutting. The roll geometry is drawn straight into a numpy image and saved
+# as a PNG, which any image viewer opens right away, unlike a roll-length svg. It is the same geometry
+# the svg is written from, mirrored the same way: holes in black (long notes with their bridges, the
+# sustain note shifted), cut lines in red and registration marks in blue. A pixel is filled when its
+# centre is inside the shape, holes smaller than a pixel still get one. The image is drawn and
+# compressed BAND_ROWS rows at a time, so only one band is ever in memory, however long the roll.
+
+PREVIEW_MM_PER_PIXEL = 0.5  # Resolution of the preview, smaller is sharper but bigger
+PAPER_COLOR = (255, 255, 255)
+HOLE_COLOR = (0, 0, 0)
+CUT_LINE_COLOR = (255, 0, 0)
+MARK_COLOR = (0, 0, 255)
+PNG_COMPRESSION = 6  # zlib level for the PNG data
+BAND_ROWS = 256  # Image rows drawn and compressed at a time
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def write_png(f, width, height, bands):
+    """Write an RGB PNG to the open file f from bands, uint8 arrays (rows, width, 3) from the top down."""
+    f.write(b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))  # 8 bit RGB
+    compressor = zlib.compressobj(PNG_COMPRESSION)
+    for band in bands:
+        # Every row starts with filter type 0 (none)
+        rows = np.zeros((len(band), width * 3 + 1), dtype=np.uint8)
+        rows[:, 1:] = band.reshape(len(band), width * 3)
+        data = compressor.compress(rows)
+        if data:
+            f.write(png_chunk(b"IDAT", data))
+    f.write(png_chunk(b"IDAT", compressor.flush()) + png_chunk(b"IEND", b""))
+
+
+def pixel_spans(low, high, pixel, size):
+    """First and last + 1 pixel from low to high (arrays in svg units), at least one, kept inside the image."""
+    first = np.clip(np.floor(low / pixel), 0, size - 1).astype(np.int64)
+    last = np.minimum(np.maximum(np.ceil(high / pixel).astype(np.int64), first + 1), size)
+    return first, last
+
+
+def line_spans(lines, pixel, width, height):
+    """Pixel rows and columns covered by straight lines along x or y (the cut lines and marks), one pixel wide."""
+    x1, y1, x2, y2 = np.array(lines, dtype=float).reshape(-1, 4).T
+    return pixel_spans(np.minimum(y1, y2), np.maximum(y1, y2), pixel, height) + pixel_spans(np.minimum(x1, x2), np.maximum(x1, x2), pixel, width)
+
+
+def draw_lines(band, band_top, spans, color):
+    row_start, row_end, col_start, col_end = spans
+    for i in np.flatnonzero((row_start < band_top + len(band)) & (row_end > band_top)).tolist():
+        band[max(row_start[i] - band_top, 0):row_end[i] - band_top, col_start[i]:col_end[i]] = color
+
+
+def hole_mask(x, y, w, h, r, row_start, row_end, col_start, col_end, pixel):
+    """Pixels of the hole's span whose centre is inside the hole with its corners cut off, all of them if none is."""
+    centre_x = (np.arange(col_start, col_end) + 0.5) * pixel
+    centre_y = (np.arange(row_start, row_end) + 0.5) * pixel
+    dx = np.maximum(np.maximum(x + r - centre_x, centre_x - (x + w - r)), 0)
+    dy = np.maximum(np.maximum(y + r - centre_y, centre_y - (y + h - r)), 0)
+    inside = dx[np.newaxis, :] ** 2 + dy[:, np.newaxis] ** 2 <= r * r
+    if not inside.any():
+        inside[:] = True
+    return inside
+
+
+def preview_bands(geometry, mm_per_pixel=PREVIEW_MM_PER_PIXEL, marks=(), band_rows=BAND_ROWS):
+    """Image size of the geometry as it looks in the svg, and a generator of its RGB bands from the top down."""
+    pixel = mm_per_pixel * geometry.scaling_factor  # Svg units per pixel
+    width = max(int(np.ceil(geometry.width / pixel)), 1)
+    height = max(int(np.ceil(geometry.height / pixel)), 1)
+
+    # Mirrored like the svg
+    def mirror(lines):
+        return [((geometry.width - x1, y1), (geometry.width - x2, y2)) for (x1, y1), (x2, y2) in lines]
+
+    cut_line_spans = line_spans(mirror(geometry.cut_lines), pixel, width, height)
+    mark_spans = line_spans(mirror(marks), pixel, width, height)
+
+    # Holes in the order of their first pixel row, a band only looks at the ones that can reach it
+    rect_x, rect_y, hole_width, hole_height, radius = geometry.holes[:5]
+    keep = hole_height > 0
+    left, top, hole_width, hole_height = geometry.width - rect_x[keep] - hole_width[keep], rect_y[keep], hole_width[keep], hole_height[keep]
+    radius = np.minimum(radius[keep], np.minimum(hole_width, hole_height) / 2)
+    row_start, row_end = pixel_spans(top, top + hole_height, pixel, height)
+    col_start, col_end = pixel_spans(left, left + hole_width, pixel, width)
+    order = np.argsort(row_start, kind="stable")
+    holes = [values[order] for values in (left, top, hole_width, hole_height, radius, row_start, row_end, col_start, col_end)]
+    tallest = int((row_end - row_start).max(initial=0))
+
+    def bands():
+        for band_top in range(0, height, band_rows):
+            band_bottom = min(band_top + band_rows, height)
+            band = np.empty((band_bottom - band_top, width, 3), dtype=np.uint8)
+            band[:] = PAPER_COLOR
+            draw_lines(band, band_top, cut_line_spans, CUT_LINE_COLOR)
+            draw_lines(band, band_top, mark_spans, MARK_COLOR)
+            first, last = np.searchsorted(holes[5], (band_top - tallest, band_bottom))
+            for x, y, w, h, r, hole_top, hole_bottom, hole_left, hole_right in zip(*(values[first:last].tolist() for values in holes)):
+                if hole_bottom <= band_top:
+                    continue
+                # The whole hole is worked out, so a hole across two bands looks the same as in one
+                inside = hole_mask(x, y, w, h, r, hole_top, hole_bottom, hole_left, hole_right, pixel)
+                low, high = max(hole_top, band_top), min(hole_bottom, band_bottom)
+                band[low - band_top:high - band_top, hole_left:hole_right][inside[low - hole_top:high - hole_top]] = HOLE_COLOR
+            yield band
+
+    return width, height, bands()
+
+
+def write_preview(filename, geometry, mm_per_pixel=PREVIEW_MM_PER_PIXEL, marks=()):
+    width, height, bands = preview_bands(geometry, mm_per_pixel, marks)
+    with open(filename, "wb") as f:
+        write_png(f, width, height, bands)
@@ -0,0 +1,69 @@
+import os
+import sys
+import argparse
+from functools import partial
+from batchconvert import run_batch
+import rollengine
+import rollmetrics
+
+# The command line the main scripts share. miditoroll.py and miditoorgan.py each pass their one
+# instrument, multiroll.py passes all of them (and gets --instrument to pick). Everything else,
+# the options, batch mode, profiling and the exit status, is the same for every script.
+
+
+def convert_file(midi_file, profiles, options, time_step, use_cache=True, metrics=False):
+    """Write a roll for every profile next to the MIDI file, returns the output file name(s)."""
+    rollmetrics.reset()
+    written = rollengine.render_profiles(midi_file, profiles, options, time_step, use_cache)
+    if metrics:
+        suffix = profiles[0].output_suffix if len(profiles) == 1 else ""
+        rollmetrics.write_report(os.path.splitext(midi_file)[0] + suffix + rollmetrics.METRICS_SUFFIX)
+    return ", ".join(written)
+
+
+def main(description, profiles, options, time_step, use_cache, roll_name):
+    """Run a main script: convert the MIDI files on the command line (or asked for) into rolls.
+
+    profiles maps instrument names to their InstrumentProfile, with more than one --instrument picks
+    which to make. roll_name is what is being made, for the messages ("piano roll", "rolls").
+    Exits with status 1 if any file failed.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("midi_files", nargs="*", help="MIDI files to convert (asks for one if none are given)")
+    if len(profiles) > 1:
+        parser.add_argument("--instrument", action="append", choices=list(profiles), help="instrument to make a roll for, can be repeated (default: all)")
+    parser.add_argument("--batch", metavar="PATH", help="convert every .mid file in this folder, or matching this glob")
+    parser.add_argument("--format", choices=list(rollengine.OUTPUT_EXTENSIONS), default=options.output_format, help="output file format (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="always parse the MIDI files, ignore and don't fill the cache")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes for --batch (default: all cores)")
+    parser.add_argument("--render-workers", type=int, default=options.render_workers, help="number of processes writing the svg of each roll, keep it at 1 with --batch (default: %(default)s)")
+    parser.add_argument("--preview-mm-per-pixel", type=float, default=options.preview_mm_per_pixel, help="resolution of the --format png preview, smaller is sharper (default: %(default)s)")
+    parser.add_argument("--profile", action="store_true", help="print the time spent in each stage and what went through it")
+    parser.add_argument("--metrics", action="store_true", help=f"write stage timings and counters to <midi file>{rollmetrics.METRICS_SUFFIX}, for every file with --batch")
+    parser.add_argument("--cprofile", metavar="FILE", help="run the hole and output stages under cProfile and save the stats to FILE")
+    args = parser.parse_args()
+
+    names = getattr(args, "instrument", None) or list(profiles)
+    options = options._replace(output_format=args.format, render_workers=args.render_workers, preview_mm_per_pixel=args.preview_mm_per_pixel)
+    convert = partial(convert_file, profiles=[profiles[name] for name in names], options=options, time_step=time_step,
+                      use_cache=use_cache and not args.no_cache, metrics=args.metrics)
+    if args.batch:
+        sys.exit(1 if run_batch(convert, args.batch, workers=args.workers) else 0)
+
+    midi_files = args.midi_files or [input("Enter the name of the MIDI file (excluding .mid extension): ") + ".mid"]
+    if args.cprofile:
+        rollmetrics.start_cprofile()
+    failed = 0
+    for midi_file in midi_files:
+        try:
+            print(f"Generating {roll_name}...")
+            convert(midi_file)
+            if args.profile:
+                rollmetrics.print_report()
+            print("Script completed successfully.")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            failed += 1
+    if args.cprofile:
+        rollmetrics.stop_cprofile(args.cprofile)
+    sys.exit(1 if failed else 0)
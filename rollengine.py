@@ -0,0 +1,657 @@
+import heapq
+from collections import namedtuple
+from functools import lru_cache, partial
+from fractions import Fraction
+import os
+import parsecache
+import rollmetrics
+
+# The part of the converters that doesn't depend on the instrument. A MIDI file is parsed once into
+# notes for all 128 MIDI note numbers, then every instrument profile picks the notes it has holes for
+# and turns them into its own roll. miditoroll.py and miditoorgan.py build their profile from the
+# configuration variables at the top of the script, multiroll.py renders several from one parse.
+# numpy, mido, svgwrite and the modules that write the files are imported where they are used, so
+# scripts that only import this for its settings (or are asked for --help) start right away, and a
+# roll that comes from the cache doesn't load what it doesn't need.
+
+SCALING_FACTOR = 2.82  # Scale to achieve accurate 2mm hole size in Illustrator
+MIDI_NOTES = 128  # Rows in a parsed note table, one per MIDI note number
+EXACT_MIN_STEP = 0.0001  # Finest step of exact timing in seconds, files with no common grid that coarse (tempo changes) are rounded to it
+CHECK_RUNS_MAX_CELLS = 50 * 1000 * 1000  # Biggest roll (rows * steps) the cell-by-cell run check is done for, it takes a byte and some time per cell
+
+# Parsed notes as parallel arrays: one entry per note with its row, start step and end step
+NoteTable = namedtuple("NoteTable", ["rows", "starts", "ends", "num_rows", "num_steps"])
+
+# Everything about the instrument and its paper, all lengths in mm. notes are the MIDI note numbers
+# of the holes from the first row to the last, bridge_rounding None rounds long notes like short ones,
+# sustain_note (None for none) is moved towards the row before it by note_height / sustain_adjust and
+# note_shortening takes that much off the length of every hole.
+InstrumentProfile = namedtuple("InstrumentProfile", [
+    "name", "notes", "note_height", "base_length_mm", "vertical_gap", "note_vertical_offset",
+    "long_note_threshold", "bridge_width", "bridge_rounding", "min_first_part_length", "note_shortening",
+    "sustain_note", "sustain_adjust", "paper_width", "blank_space", "blank_space_end",
+    "cut_line_segment_length", "cut_line_segment_gap", "horizontal_cut_lines", "output_suffix",
+])
+
+# How the roll gets written, the same for every instrument (see the configuration variables in the main scripts)
+OutputOptions = namedtuple("OutputOptions", [
+    "output_format", "svg_style", "stream_svg", "compress_svg", "double_cut", "toolpath_order",
+    "toolpath_band_mm", "tile_length_mm", "tile_overlap_mm", "check_runs", "render_workers", "preview_mm_per_pixel",
+])
+OUTPUT_EXTENSIONS = {"svg": ".svg", "hpgl": ".plt", "gcode": ".gcode", "png": ".png"}  # File extension for every output format
+SVG_STYLES = ("rects", "paths", "shapes")  # Ways the holes can be written in the svg, see svgstream.py
+RENAMED_SETTINGS = {"bridge_width_mm": "bridge_width"}  # Keywords of the old piano_roll_to_svg named differently in InstrumentProfile
+
+def merged_messages(midi):
+    """Yield (absolute tick, message) for all tracks merged in time order, ties keep track order like mido does."""
+    def absolute_ticks(track):
+        tick = 0
+        for msg in track:
+            tick += msg.time
+            yield tick, msg
+    return heapq.merge(*(absolute_ticks(track) for track in midi.tracks), key=lambda event: event[0])
+
+@rollmetrics.stage("parse")
+def parse_midi(midi_file, time_step):
+    """Read every note of the file into a NoteTable with the MIDI note number as the row.
+
+    Note times are rounded down to steps of time_step seconds. With time_step None the steps are the
+    longest ones every note start and end (and the end of the roll) falls on exactly, so nothing gets
+    rounded and there are as few steps as the music allows. Tempo changes can leave no such grid worth
+    the name, the steps are then never shorter than EXACT_MIN_STEP and the times are rounded down to them.
+    """
+    import mido
+    import numpy as np
+
+    print("Loading MIDI file...")
+    midi = mido.MidiFile(midi_file)
+
+    # Time is kept in microseconds * ticks_per_beat so tick to step conversion stays exact integer math
+    exact = time_step is None
+    if not exact:
+        step_size = Fraction(str(time_step)) * 1000000
+        step_divisor = midi.ticks_per_beat * step_size.numerator
+    tempo = 500000  # Default tempo until the first set_tempo
+    tempo_tick = 0
+    tempo_time = 0
+    num_steps = 0
+
+    print("Processing MIDI events...")
+    active_notes = {}
+    note_rows, note_starts, note_ends = [], [], []
+
+    message_count = 0
+    for message_count, (tick, msg) in enumerate(merged_messages(midi), 1):
+        # Elapsed time at this tick using the tempo map so far
+        elapsed = tempo_time + (tick - tempo_tick) * tempo
+        if msg.type == 'set_tempo':
+            tempo, tempo_tick, tempo_time = msg.tempo, tick, elapsed
+        if not msg.is_meta:
+            step_index = elapsed if exact else elapsed * step_size.denominator // step_divisor
+            num_steps = step_index  # The roll ends at the last non-meta message
+
+            if msg.type == 'note_on' and msg.velocity > 0:
+                active_notes[msg.note] = step_index  # Store the start time for this note
+            elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
+                if msg.note in active_notes:
+                    note_rows.append(msg.note)
+                    note_starts.append(active_notes.pop(msg.note))
+                    note_ends.append(step_index)
+
+    if exact:
+        # Largest step that divides every time used, in microseconds * ticks_per_beat
+        times = np.array(note_starts + note_ends + [num_steps], dtype=np.int64)
+        quantum = int(np.gcd.reduce(times)) or 1
+        min_quantum = int(Fraction(str(EXACT_MIN_STEP)) * 1000000) * midi.ticks_per_beat
+        if quantum < min_quantum:
+            # Coarsest grid on top of the finest step allowed, every time rounded down to that step is on it
+            quantum = min_quantum * (int(np.gcd.reduce(times // min_quantum)) or 1)
+            print(f"Exact timing: the notes have no common grid of {EXACT_MIN_STEP * 1000:g} ms or longer, their times are rounded down to one.")
+        note_starts = [start // quantum for start in note_starts]
+        note_ends = [end // quantum for end in note_ends]
+        num_steps //= quantum
+        print(f"Exact timing: steps of {quantum / (midi.ticks_per_beat * 1000):.4g} ms, {num_steps} steps.")
+
+    # Notes can't run past the end of the roll
+    notes = NoteTable(
+        rows=np.array(note_rows, dtype=np.int64),
+        starts=np.minimum(np.array(note_starts, dtype=np.int64), num_steps),
+        ends=np.minimum(np.array(note_ends, dtype=np.int64), num_steps),
+        num_rows=MIDI_NOTES,
+        num_steps=num_steps,
+    )
+    rollmetrics.count("midi_messages", message_count)
+    rollmetrics.count("notes", len(notes.rows))
+    rollmetrics.count("steps", num_steps)
+    print("MIDI file successfully processed.")
+    return notes
+
+@rollmetrics.stage("notes")
+def profile_notes(notes, profile):
+    """The notes the profile has holes for, with their row on its roll, and the shortest of their durations.
+
+    Zero length notes are left out, they leave no hole and would make the shortest duration 0.
+    """
+    import numpy as np
+
+    row_of_note = np.full(notes.num_rows, -1, dtype=np.int64)  # -1 for notes that aren't on the roll
+    row_of_note[list(profile.notes)] = np.arange(len(profile.notes))
+    rows = row_of_note[notes.rows]
+    keep = (rows >= 0) & (notes.starts < notes.ends)
+    table = NoteTable(rows[keep], notes.starts[keep], notes.ends[keep], len(profile.notes), notes.num_steps)
+    durations = table.ends - table.starts
+    min_duration = int(durations.min()) if len(durations) else 1
+    rollmetrics.count("notes_on_roll", len(table.rows))
+    return table, min_duration
+
+def note_runs(notes):
+    """Merge notes that overlap or touch on the same row into the runs that get cut, sorted by row and start."""
+    import numpy as np
+
+    keep = notes.starts < notes.ends  # Zero length notes leave no hole
+    rows, starts, ends = notes.rows[keep], notes.starts[keep], notes.ends[keep]
+    order = np.lexsort((starts, rows))
+    rows, starts, ends = rows[order], starts[order], ends[order]
+
+    # Furthest end reached so far on each row, offset by row so the running max doesn't carry over between rows
+    row_offset = rows * (notes.num_steps + 1)
+    reach = np.maximum.accumulate(ends + row_offset) - row_offset
+
+    # A run starts on a new row or after a gap, and ends right before the next one starts
+    run_start = np.ones(len(rows), dtype=bool)
+    run_start[1:] = (rows[1:] != rows[:-1]) | (starts[1:] > reach[:-1])
+    first = np.flatnonzero(run_start)
+    last = np.flatnonzero(np.roll(run_start, -1))
+    return rows[first], starts[first], reach[last]
+
+def run_of_notes(notes, runs):
+    """Index into runs (from note_runs) of the run every note is cut in."""
+    import numpy as np
+
+    rows, starts, _ = runs
+    width = notes.num_steps + 1
+    return np.searchsorted(rows * width + starts, notes.rows * width + notes.starts, side="right") - 1
+
+def scan_note_runs(notes):
+    """Old cell-by-cell run scan over a dense roll matrix, only used to check note_runs."""
+    import numpy as np
+
+    matrix = np.zeros((notes.num_rows, notes.num_steps), dtype=np.int8)
+    for row, start, end in zip(notes.rows.tolist(), notes.starts.tolist(), notes.ends.tolist()):
+        matrix[row, start:end] = 1
+
+    runs = []
+    rows, cols = matrix.shape
+    for row in range(rows):
+        col_start = None
+        for col in range(cols):
+            if matrix[row, col] == 1:
+                if col_start is None:
+                    col_start = col
+            elif col_start is not None:
+                runs.append((row, col_start, col))
+                col_start = None
+        if col_start is not None:
+            runs.append((row, col_start, cols))
+    runs = np.array(runs, dtype=np.int64).reshape(-1, 3)
+    return runs[:, 0], runs[:, 1], runs[:, 2]
+
+def split_long_notes(y, duration, long_note_threshold, bridge_width, min_first_part_length):
+    """Split runs longer than the threshold into bridged parts, batched over all runs.
+
+    Returns the run index, y position and length of every part in drawing order. Runs that
+    aren't long stay a single part.
+    """
+    import numpy as np
+
+    long_note = duration > long_note_threshold
+    remaining = duration.copy()
+    full_parts = np.zeros(len(duration), dtype=np.int64)
+
+    # Break into full segments first, one segment per round for every run that still has one left
+    peel = long_note & (remaining > long_note_threshold + bridge_width)
+    while peel.any():
+        remaining[peel] -= long_note_threshold + bridge_width
+        full_parts[peel] += 1
+        peel &= remaining > long_note_threshold + bridge_width
+
+    # A first part that is too short gets merged with the next part
+    merge = long_note & (remaining < min_first_part_length) & (full_parts > 0)
+    first_part = np.where(merge, long_note_threshold + (remaining + bridge_width), remaining)
+    num_parts = full_parts + 1 - merge
+
+    run_index = np.repeat(np.arange(len(duration)), num_parts)
+    first_index = np.cumsum(num_parts) - num_parts
+    part_length = np.full(len(run_index), long_note_threshold, dtype=float)
+    part_length[first_index] = first_part
+    part_y = np.empty(len(run_index))
+    part_y[first_index] = y
+
+    # Each part starts one bridge after the previous one
+    for i in range(1, num_parts.max(initial=0)):
+        index = first_index[num_parts > i] + i
+        part_y[index] = part_y[index - 1] + (part_length[index - 1] + bridge_width)
+
+    return run_index, part_y, part_length
+
+def split_long_notes_scalar(y, duration, long_note_threshold, bridge_width, min_first_part_length):
+    """Old per-note version of split_long_notes, only used to check it."""
+    import numpy as np
+
+    run_index, part_y, part_length = [], [], []
+    for i, (start_y, duration_height) in enumerate(zip(y.tolist(), duration.tolist())):
+        parts = [duration_height]
+        if duration_height > long_note_threshold:
+            remaining_duration = duration_height
+            parts = []
+
+            # Break into full segments first
+            while remaining_duration > long_note_threshold + bridge_width:
+                parts.append(long_note_threshold)
+                remaining_duration -= long_note_threshold + bridge_width
+
+            # Ensure the first part is long enough
+            if remaining_duration < min_first_part_length:
+                # Merge the first part with the next part if too short
+                if parts:
+                    parts[0] += remaining_duration + bridge_width
+                else:
+                    parts.append(remaining_duration)  # If no other parts, use remaining duration
+            else:
+                # Add remaining duration as the first part
+                parts.insert(0, remaining_duration)
+
+        current_y = start_y
+        for part in parts:
+            run_index.append(i)
+            part_y.append(current_y)
+            part_length.append(part)
+            current_y += part + bridge_width
+    return np.array(run_index, dtype=np.int64), np.array(part_y, dtype=float), np.array(part_length, dtype=float)
+
+# Everything that gets cut, in svg units before mirroring: page size, cut line segments and note holes
+# (x, y, width, height, corner radius and row arrays for every hole, in cutting order)
+RollGeometry = namedtuple("RollGeometry", ["width", "height", "scaling_factor", "cut_lines", "holes"])
+
+@rollmetrics.stage("holes")
+def hole_geometry(notes, min_duration, profile, options):
+    """Page size and note holes of the roll, the cut lines are added by cut_line_segments."""
+    import numpy as np
+
+    scaling_factor = SCALING_FACTOR
+
+    # Adjust all measurements by scaling factor
+    scaled_note_height = profile.note_height * scaling_factor
+    scaled_base_length_mm = profile.base_length_mm * scaling_factor
+    scaled_vertical_gap = profile.vertical_gap * scaling_factor
+    scaled_note_vertical_offset = profile.note_vertical_offset * scaling_factor
+    scaled_blank_space_mm = profile.blank_space * scaling_factor
+    scaled_blank_space_end_mm = profile.blank_space_end * scaling_factor
+    scaled_long_note_threshold = profile.long_note_threshold * scaling_factor
+    scaled_bridge_width = profile.bridge_width * scaling_factor
+    min_first_part_length = profile.min_first_part_length * scaling_factor
+    scaled_note_shortening = profile.note_shortening * scaling_factor
+    long_note_radius = scaled_note_height / 2 if profile.bridge_rounding is None else profile.bridge_rounding
+    sustain_row = profile.notes.index(profile.sustain_note) if profile.sustain_note in profile.notes else -1
+
+    note_width_scaling_factor = scaled_base_length_mm / min_duration  # Adjusted scale based on shortest note
+
+    rows, cols = notes.num_rows, notes.num_steps
+    total_height = (cols * note_width_scaling_factor) + scaled_blank_space_mm + scaled_blank_space_end_mm
+    total_width = (rows * scaled_note_height) + (rows - 1) * scaled_vertical_gap + (profile.paper_width * scaling_factor) + 10 * scaling_factor
+    right_cut_line_x = 5 * scaling_factor + (profile.paper_width * scaling_factor)  # The holes are placed from the right cut line
+
+    def note_rects(run_rows, run_starts, run_ends, split):
+        # Position each run with vertical offset for blank space at the beginning
+        y = (run_starts * note_width_scaling_factor) + scaled_blank_space_mm
+        x = run_rows * (scaled_note_height + scaled_vertical_gap) + scaled_note_vertical_offset + 1 * scaling_factor
+        x[run_rows == sustain_row] -= scaled_note_height / profile.sustain_adjust  # Shift the sustain note towards the row before it
+        duration_height = (run_ends - run_starts) * note_width_scaling_factor - scaled_note_shortening
+
+        # Split long notes into multiple parts, these get the bridge rounding
+        run_index, part_y, part_length = split(y, duration_height, scaled_long_note_threshold, scaled_bridge_width, min_first_part_length)
+        radius = np.where(duration_height > scaled_long_note_threshold, long_note_radius, scaled_note_height / 2)[run_index]
+        return (
+            right_cut_line_x - x[run_index] - scaled_note_height,
+            total_height - part_y - part_length,
+            np.full(len(run_index), scaled_note_height),
+            part_length,
+            radius,
+            run_rows[run_index],
+        )
+
+    # Note holes
+    runs = note_runs(notes)
+    rects = note_rects(*runs, split_long_notes)
+    rollmetrics.count("note_runs", len(runs[0]))
+    rollmetrics.count("bridges", len(rects[0]) - len(runs[0]))  # Every part a long note is split into adds a bridge
+    rollmetrics.count("holes", len(rects[0]))
+    if options.check_runs and notes.num_rows * notes.num_steps > CHECK_RUNS_MAX_CELLS:
+        print(f"Run check skipped, the roll has {notes.num_rows * notes.num_steps} cells and the check is limited to {CHECK_RUNS_MAX_CELLS}.")
+    elif options.check_runs:
+        old_rects = note_rects(*scan_note_runs(notes), split_long_notes_scalar)
+        if not all(np.array_equal(new, old) for new, old in zip(rects, old_rects)):
+            raise ValueError("Vectorized note runs don't match the cell-by-cell scan")
+        print(f"Run check passed, {len(rects[0])} note rectangles match.")
+
+    if options.toolpath_order != "rows":
+        from toolpath import order_holes
+        rects = order_holes(rects, options.toolpath_order, options.toolpath_band_mm * scaling_factor, scaling_factor)
+
+    return RollGeometry(total_width, total_height, scaling_factor, [], rects)
+
+def perforation(first, last, segment_length, gap, include_last=False):
+    """Start and end arrays of the segments of a segmented line from first to last.
+
+    Segments are segment_length long with gap between them, the last one is cut off at last. A segment
+    may start exactly at last if include_last is set. Each start is the previous end plus the gap, so a
+    running sum over segment lengths and gaps in turn gives every end point with the same rounding as
+    adding them up one by one.
+    """
+    import numpy as np
+
+    count = max(int((last - first) // (segment_length + gap)) + 2, 1)
+    steps = np.empty(2 * count)
+    steps[0] = first
+    steps[1::2] = segment_length
+    steps[2::2] = gap
+    points = np.cumsum(steps)
+    starts, ends = points[0::2], points[1::2]
+    keep = starts <= last if include_last else starts < last
+    return starts[keep], np.minimum(ends[keep], last)
+
+@rollmetrics.stage("cut_lines")
+def cut_line_segments(total_height, profile):
+    """Segmented cut lines along both paper edges, and across the start and end of the roll if enabled."""
+    scaling_factor = SCALING_FACTOR
+
+    # Define cut line positions
+    cut_line_x = 5 * scaling_factor  # Position for the left cut line
+    right_cut_line_x = cut_line_x + (profile.paper_width * scaling_factor)  # Position for the right cut line, one paper width to the right
+
+    # Convert segment length and gap to scaled values
+    scaled_cut_line_segment_length = profile.cut_line_segment_length * scaling_factor
+    scaled_cut_line_segment_gap = profile.cut_line_segment_gap * scaling_factor
+
+    def segments(first, last, include_last=False):
+        starts, ends = perforation(first, last, scaled_cut_line_segment_length, scaled_cut_line_segment_gap, include_last)
+        starts = starts.tolist()
+        if starts:
+            starts[0] = first  # Keep the first start as given (0 stays an int in the svg)
+        return list(zip(starts, ends.tolist()))
+
+    # Left and right segmented cut lines
+    cut_lines = []
+    vertical = segments(0, total_height)
+    for x in (cut_line_x, right_cut_line_x):
+        cut_lines += [((x, y1), (x, y2)) for y1, y2 in vertical]
+
+    # Horizontal cutting lines if enabled
+    if profile.horizontal_cut_lines:
+        horizontal = segments(cut_line_x, right_cut_line_x, include_last=True)
+        for y in (0, total_height):
+            cut_lines += [((x1, y), (x2, y)) for x1, x2 in horizontal]
+
+    return cut_lines
+
+def roll_geometry(notes, min_duration, profile, options):
+    geometry = hole_geometry(notes, min_duration, profile, options)
+    return geometry._replace(cut_lines=cut_line_segments(geometry.height, profile))
+
+def roll_sheets(geometry, filename, options):
+    """(geometry, registration marks, file name) for each file to write, one sheet at a time if tiling."""
+    if not options.tile_length_mm:
+        yield geometry, [], filename
+        return
+    from tiling import roll_tiles, tile_file_name
+    scaling_factor = geometry.scaling_factor
+    sheets = roll_tiles(geometry, options.tile_length_mm * scaling_factor, options.tile_overlap_mm * scaling_factor)
+    for sheet, (sheet_geometry, marks) in enumerate(sheets, 1):
+        yield sheet_geometry, marks, tile_file_name(filename, sheet)
+
+def geometry_to_svg(geometry, filename, options, marks=()):
+    from svgstream import StreamingSVG, compact_holes, cut_line_paths, chunk_slices, render_chunks, rect_markup
+
+    total_width, total_height = geometry.width, geometry.height
+
+    if options.svg_style not in SVG_STYLES:
+        raise ValueError(f"Unknown SVG_STYLE '{options.svg_style}', use one of {', '.join(SVG_STYLES)}")
+    if options.svg_style != "rects" and not options.stream_svg:
+        raise ValueError(f"SVG_STYLE '{options.svg_style}' only works with STREAM_SVG = True")
+
+    if options.stream_svg:
+        # Elements go straight to the file, so the mirroring is set on the root group up front
+        dwg = StreamingSVG(filename, size=(total_width, total_height), compress=options.compress_svg)
+        root_group = dwg.g(transform=f"translate({total_width},0) scale(-1,1)")
+    else:
+        from svgwrite import Drawing
+        dwg = Drawing(filename, size=(total_width, total_height))
+
+        # Add a root group to hold all elements for easier transformations
+        root_group = dwg.g()
+
+    try:
+        # Draw the segmented cut lines, as one path per line in the compact styles
+        if options.svg_style == "rects":
+            rollmetrics.count("svg_line_elements", len(geometry.cut_lines))
+            for start, end in geometry.cut_lines:
+                root_group.add(dwg.line(start=start, end=end, stroke='red', stroke_width=1))
+        else:
+            for markup in cut_line_paths(geometry.cut_lines, fill="none", stroke="red", stroke_width=1):
+                root_group.add(markup)
+                rollmetrics.count("svg_line_elements")
+        rollmetrics.count("svg_line_elements", len(marks))
+
+        # Registration marks for lining up sheets
+        for start, end in marks:
+            root_group.add(dwg.line(start=start, end=end, stroke='blue', stroke_width=1))
+
+        # Draw notes, when streaming a chunk of holes at a time, made on options.render_workers processes
+        passes = 2 if options.double_cut else 1
+        if options.svg_style == "rects" and options.stream_svg:
+            holes = geometry.holes[:5]
+            for markup in render_chunks(partial(rect_markup, passes=passes), holes, chunk_slices(len(holes[0])), options.render_workers):
+                root_group.add("".join(markup))
+            rollmetrics.count("svg_hole_elements", len(geometry.holes[0]) * passes)
+        elif options.svg_style == "rects":
+            for rect_x, rect_y, width, height, radius, _ in zip(*(values.tolist() for values in geometry.holes)):
+                for _ in range(passes):  # Draw twice if DOUBLE_CUT is True
+                    root_group.add(dwg.rect(insert=(rect_x, rect_y), size=(width, height), fill="black", rx=radius, ry=radius))
+            rollmetrics.count("svg_hole_elements", len(geometry.holes[0]) * passes)
+        else:
+            for markup in compact_holes(options.svg_style, *geometry.holes, passes=passes, workers=options.render_workers):
+                root_group.add(markup)
+                rollmetrics.count("svg_hole_elements")
+        if options.stream_svg:
+            dwg.close()
+    except BaseException:
+        if options.stream_svg:
+            dwg.abort()  # No half written roll is left behind
+        raise
+
+    if not options.stream_svg:
+        # Apply mirroring to the root group
+        root_group.translate(total_width, 0)  # Translate content to the right edge
+        root_group.scale(-1, 1)  # Mirror horizontally
+
+        # Add the root group to the SVG
+        dwg.add(root_group)
+        dwg.save()
+    print(f"SVG file '{filename}' created successfully.")
+    return filename
+
+@rollmetrics.stage("output")
+def write_geometry(geometry, options, filename):
+    """Write the geometry as options.output_format, one file per sheet when tiling. Returns the names of the files written."""
+    written = []
+    for sheet_geometry, marks, sheet_file in roll_sheets(geometry, filename, options):
+        if options.output_format == "svg":
+            geometry_to_svg(sheet_geometry, sheet_file, options, marks)
+        elif options.output_format == "png":
+            from preview import write_preview
+            write_preview(sheet_file, sheet_geometry, options.preview_mm_per_pixel, marks)
+            print(f"Preview '{sheet_file}' created successfully.")
+        else:
+            # Registration marks are svg and preview only
+            from plotter import write_plot
+            write_plot(sheet_file, sheet_geometry, options.output_format, passes=2 if options.double_cut else 1)
+            rollmetrics.count("plot_cuts", len(sheet_geometry.cut_lines) + len(sheet_geometry.holes[0]) * (2 if options.double_cut else 1))
+            print(f"{options.output_format.upper()} file '{sheet_file}' created successfully.")
+        rollmetrics.count("bytes_written", os.path.getsize(sheet_file))
+        written.append(sheet_file)
+    return written
+
+def profile_with(profile, settings):
+    """The profile with settings replaced, by InstrumentProfile field or by the old piano_roll_to_svg keyword."""
+    settings = {RENAMED_SETTINGS.get(name, name): value for name, value in settings.items()}
+    unknown = sorted(set(settings) - set(profile._fields))
+    if unknown:
+        raise TypeError(f"Unknown roll setting(s): {', '.join(unknown)} (expected InstrumentProfile fields)")
+    return profile._replace(**settings)
+
+def roll_to_svg(notes, min_duration, profile, options, filename):
+    """Write the roll as svg, returns the names of the files written."""
+    return write_geometry(roll_geometry(notes, min_duration, profile, options), options._replace(output_format="svg"), filename)
+
+def roll_to_plotter(notes, min_duration, profile, options, filename):
+    """Write the roll as HPGL or G-code (options.output_format), returns the names of the files written."""
+    return write_geometry(roll_geometry(notes, min_duration, profile, options), options, filename)
+
+# The conversion as a pipeline of stages. Every stage is cached under a fingerprint of its inputs,
+# which is the key of the stage before it plus the settings the stage itself uses, so a re-run only
+# redoes the stages whose inputs changed:
+#   parse      MIDI file contents, time step and this file's code -> notes for all MIDI note numbers
+#   holes      the profile's hole settings, the toolpath order and its code -> page size and note holes
+#   cut lines  roll length and cut line settings -> always redone, they take no time
+#   output     all settings, the file name and the writers' own settings and code -> skipped while the
+#              files written last time are unchanged
+HOLE_SETTINGS = (
+    "notes", "note_height", "base_length_mm", "vertical_gap", "note_vertical_offset", "long_note_threshold",
+    "bridge_width", "bridge_rounding", "min_first_part_length", "note_shortening", "sustain_note",
+    "sustain_adjust", "paper_width", "blank_space", "blank_space_end",
+)
+HOLE_ARRAYS = ("hole_x", "hole_y", "hole_width", "hole_height", "hole_radius", "hole_row")
+OUTPUT_MODULES = ("rollengine", "svgstream", "toolpath", "plotter", "preview", "tiling")  # Modules whose settings and code shape the files written
+
+@lru_cache(maxsize=None)
+def code_hash(module_name):
+    """Hash of the code of a module next to this one, a stage computed by that code is cached under it."""
+    return parsecache.file_hash(os.path.join(os.path.dirname(os.path.abspath(__file__)), module_name + ".py"))
+
+def parse_key(midi_file, time_step):
+    exact_min_step = EXACT_MIN_STEP if time_step is None else None  # Only exact timing uses it
+    return parsecache.cache_key(midi_file, "notes", time_step, exact_min_step, code_hash("rollengine"))
+
+def load_midi(midi_file, time_step, key=None):
+    """Parse stage: parse_midi, but reuses an earlier parse stored under key (from parse_key, None to always parse)."""
+    if key is not None:
+        cached = parsecache.load(key)
+        if cached is not None:
+            print("Using cached MIDI data.")
+            rollmetrics.count("cache_hits")
+            return NoteTable(cached["rows"], cached["starts"], cached["ends"], int(cached["num_rows"]), int(cached["num_steps"]))
+
+    notes = parse_midi(midi_file, time_step)
+    if key is not None:
+        parsecache.store(key, **notes._asdict())
+    return notes
+
+def load_holes(load_notes, profile, options, key=None):
+    """Holes stage: hole_geometry for the profile. load_notes() gives the parsed notes, it isn't called if the holes are cached."""
+    if key is not None:
+        cached = parsecache.load(key)
+        if cached is not None:
+            print(f"Using cached {profile.name} roll holes.")
+            rollmetrics.count("cache_hits")
+            holes = tuple(cached[name] for name in HOLE_ARRAYS)
+            return RollGeometry(float(cached["width"]), float(cached["height"]), float(cached["scaling_factor"]), [], holes)
+
+    geometry = hole_geometry(*profile_notes(load_notes(), profile), profile, options)
+    if key is not None:
+        parsecache.store(key, width=geometry.width, height=geometry.height, scaling_factor=geometry.scaling_factor, **dict(zip(HOLE_ARRAYS, geometry.holes)))
+    return geometry
+
+@lru_cache(maxsize=None)
+def output_stamp():
+    """The settings at the top of the OUTPUT_MODULES and a hash of their code, for the output stage key.
+
+    The writers are tuned by editing their constants (feed rate, preview resolution, ...), the files
+    have to be written again when one of those or the code itself changes.
+    """
+    import importlib
+    stamp = []
+    for name in OUTPUT_MODULES:
+        module = importlib.import_module(name)
+        settings = sorted((setting, value) for setting, value in vars(module).items()
+                          if setting.isupper() and isinstance(value, (bool, int, float, str, tuple)))
+        stamp.append((name, parsecache.file_hash(module.__file__), settings))
+    return tuple(stamp)
+
+def unchanged_output(key):
+    """Output stage check: the files written under key last time, or None if any of them changed or is gone."""
+    cached = parsecache.load(key)
+    if cached is None:
+        return None
+    files = cached["files"].tolist()
+    try:
+        stamps = [(os.stat(f).st_size, os.stat(f).st_mtime_ns) for f in files]
+    except OSError:
+        return None
+    if stamps != list(zip(cached["sizes"].tolist(), cached["mtimes"].tolist())):
+        return None
+    return files
+
+def store_output(key, files):
+    import numpy as np
+
+    stats = [os.stat(f) for f in files]
+    parsecache.store(
+        key,
+        files=np.array(files, dtype=str),
+        sizes=np.array([stat.st_size for stat in stats], dtype=np.int64),
+        mtimes=np.array([stat.st_mtime_ns for stat in stats], dtype=np.int64),
+    )
+
+def write_roll(load_notes, profile, options, base_name, key=None):
+    """Run the holes, cut lines and output stages for the profile, key is the parse stage key (None to cache neither stage).
+
+    Writes to base_name + the profile's suffix, returns the files written.
+    """
+    base_name += profile.output_suffix
+    if options.output_format == "svg" and options.stream_svg and options.compress_svg:
+        filename = base_name + ".svgz"
+    else:
+        filename = base_name + OUTPUT_EXTENSIONS[options.output_format]
+
+    holes_key = output_key = None
+    if key is not None:
+        hole_settings = tuple(getattr(profile, name) for name in HOLE_SETTINGS)
+        holes_key = parsecache.derived_key(key, "holes", code_hash("rollengine"), code_hash("toolpath"), hole_settings, options.check_runs, options.toolpath_order, options.toolpath_band_mm)
+        output_key = parsecache.derived_key(holes_key, "output", profile, options._replace(render_workers=1), filename, output_stamp())  # Same file on any number of workers
+        written = unchanged_output(output_key)
+        if written is not None:
+            print(f"{', '.join(written)} already up to date.")
+            return written
+
+    geometry = load_holes(load_notes, profile, options, holes_key)
+    geometry = geometry._replace(cut_lines=cut_line_segments(geometry.height, profile))
+    written = write_geometry(geometry, options, filename)
+    if output_key is not None:
+        store_output(output_key, written)
+    return written
+
+def render_profiles(midi_file, profiles, options, time_step, use_cache=True, base_name=None, cache_stages=True):
+    """Write a roll for every profile to base_name (default next to midi_file), returns all files written.
+
+    The file is parsed at most once, and not at all if every roll can be made from cached stages.
+    cache_stages False caches only the parse, for files that are written once and thrown away.
+    """
+    key = parse_key(midi_file, time_step) if use_cache else None
+    load_notes = lru_cache(maxsize=None)(partial(load_midi, midi_file, time_step, key))
+    if base_name is None:
+        base_name = os.path.splitext(midi_file)[0]
+    written = []
+    for profile in profiles:
+        print(f"Rendering {profile.name} roll...")
+        written += write_roll(load_notes, profile, options, base_name, key if cache_stages else None)
+    return written
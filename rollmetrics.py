@@ -0,0 +1,109 @@
+import cProfile
+import json
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+# Timings and counters for a conversion, so a slow run shows where the time goes. The roll engine
+# times its stages and counts what goes through them; the main scripts print the result with
+# --profile and write it to a JSON file with --metrics. With --cprofile the stages that draw the
+# roll also run under cProfile, for a look at the hot loops themselves.
+
+CPROFILE_STAGES = ("holes", "output")  # Stages that run under cProfile when it is switched on
+CPROFILE_TOP = 25  # Number of functions printed from the cProfile stats
+METRICS_SUFFIX = "_metrics.json"  # Added to the MIDI file name for --metrics
+
+timings = {}
+counters = {}
+profiler = None
+
+def reset():
+    timings.clear()
+    counters.clear()
+
+@contextmanager
+def stage(name):
+    """Add the time spent in the block (or decorated function) to the stage."""
+    profiling = profiler is not None and name in CPROFILE_STAGES
+    if profiling:
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0) + time.perf_counter() - start
+        if profiling:
+            profiler.disable()
+
+def count(name, amount=1):
+    counters[name] = counters.get(name, 0) + int(amount)
+
+def windows_peak_rss():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage",
+            )
+        ]
+
+    kernel32, psapi = ctypes.windll.kernel32, ctypes.windll.psapi
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+    memory = ProcessMemoryCounters()
+    memory.cb = ctypes.sizeof(memory)
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(memory), memory.cb):
+        return None
+    return memory.PeakWorkingSetSize
+
+def peak_rss():
+    """Most memory the process has used so far in bytes, None if it can't be found out."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            return windows_peak_rss()
+        except (AttributeError, OSError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Kilobytes except on macOS
+
+def report():
+    return {
+        "stages": {name: round(seconds, 6) for name, seconds in timings.items()},
+        "total_seconds": round(sum(timings.values()), 6),
+        "counters": dict(counters),
+        "peak_rss": peak_rss(),
+    }
+
+def print_report():
+    print("Stage timings:")
+    for name, seconds in timings.items():
+        print(f"  {name:<18} {seconds:8.3f}s")
+    print("Counters:")
+    for name, value in counters.items():
+        print(f"  {name:<18} {value}")
+    rss = peak_rss()
+    if rss is not None:
+        print(f"  {'peak_rss':<18} {rss / 1024 ** 2:.1f} MB")
+
+def write_report(filename):
+    with open(filename, "w") as f:
+        json.dump(report(), f, indent=2)
+    print(f"Metrics written to {filename}")
+
+def start_cprofile():
+    global profiler
+    profiler = cProfile.Profile()
+
+def stop_cprofile(filename):
+    """Save the cProfile stats of the profiled stages to filename and print the slowest functions."""
+    global profiler
+    profiler.dump_stats(filename)
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(CPROFILE_TOP)
+    print(f"cProfile stats written to {filename}, open them with python -m pstats {filename}")
+    profiler = None
@@ -0,0 +1,250 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from batchconvert import convert_quietly
+import rollengine
+import rollmetrics
+import multiroll
+
+# Small local web service so the rolls can be made from any workstation, not just from a terminal next
+# to the files. POST a MIDI file to /convert and the roll comes back in the response:
+#
+#   curl --data-binary @song.mid "http://host:8765/convert?instrument=organ&bridge_width=0.6" -o song.svg
+#
+# Everything after the instrument is optional: format (svg, png, hpgl, gcode) and any setting of the
+# instrument's profile or the output options (see rollengine.py), as name=value. The rolls are drawn on
+# a pool of worker processes, each request is parsed through the same cache as the scripts, so sending
+# the same file again with other settings skips the parse. GET /health tells how busy it is.
+
+HOST = "127.0.0.1"  # Use 0.0.0.0 to let other computers connect
+PORT = 8765
+MAX_UPLOAD_BYTES = 16 * 1024 * 1024  # Bigger uploads are refused
+MAX_QUEUE = 32  # Requests waiting or converting at once, more get a 503 until there is room
+LATENCY_WINDOW = 200  # Number of recent requests the latency figures in /health are taken from
+CHUNK_SIZE = 1 << 16  # Bytes per write when sending a roll back
+
+CONTENT_TYPES = {".svg": "image/svg+xml", ".svgz": "image/svg+xml", ".png": "image/png", ".plt": "application/vnd.hp-hpgl", ".gcode": "text/plain"}
+FIXED_SETTINGS = ("name", "notes", "output_suffix", "output_format", "tile_length_mm", "tile_overlap_mm", "render_workers")  # Not changeable per request
+
+
+class BadRequest(Exception):
+    pass
+
+
+def parse_setting(name, current, text):
+    """Value for the setting from the query string, typed like its current value."""
+    if isinstance(current, bool):
+        if text.lower() not in ("true", "false", "1", "0"):
+            raise BadRequest(f"{name} must be true or false")
+        return text.lower() in ("true", "1")
+    if isinstance(current, str):
+        return text
+    if text.lower() == "none" and current is None:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        raise BadRequest(f"{name} must be a number") from None
+
+
+def request_settings(query):
+    """Instrument profile and output options for the query string of a /convert request."""
+    values = {name: texts[-1] for name, texts in parse_qs(query).items()}
+    instrument = values.pop("instrument", "piano")
+    if instrument not in multiroll.PROFILES:
+        raise BadRequest(f"instrument must be one of {', '.join(multiroll.PROFILES)}")
+    output_format = values.pop("format", multiroll.OPTIONS.output_format)
+    if output_format not in rollengine.OUTPUT_EXTENSIONS:
+        raise BadRequest(f"format must be one of {', '.join(rollengine.OUTPUT_EXTENSIONS)}")
+
+    profile = multiroll.PROFILES[instrument]
+    options = multiroll.OPTIONS._replace(output_format=output_format, tile_length_mm=0, render_workers=1)
+    profile_settings, option_settings = {}, {}
+    for name, text in values.items():
+        if name in FIXED_SETTINGS:
+            raise BadRequest(f"{name} can't be changed per request")
+        if name in profile._fields:
+            profile_settings[name] = parse_setting(name, getattr(profile, name), text)
+        elif name in options._fields:
+            option_settings[name] = parse_setting(name, getattr(options, name), text)
+        else:
+            raise BadRequest(f"unknown setting {name}")
+    return profile._replace(**profile_settings), options._replace(**option_settings)
+
+
+def render_upload(midi_file, profile, options):
+    """Runs in a worker: draw the roll for the uploaded file next to it. Returns the file and the stage timings.
+
+    Only the parse is cached, under the file contents. The holes and output stages aren't: the output
+    is in a temporary folder that is gone after the request, and every entry stored costs a look
+    through the cache folder to keep it under its size limit.
+    """
+    rollmetrics.reset()
+    written = rollengine.render_profiles(midi_file, [profile], options, multiroll.TIME_STEP, multiroll.USE_PARSE_CACHE, cache_stages=False)
+    return written[0], dict(rollmetrics.timings)
+
+
+class ServiceStats:
+    """Queue depth and latency of the requests, shared by the request threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.served = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.stages = {}
+
+    def enter(self):
+        """Take a place in the queue, False if it is full."""
+        with self.lock:
+            if self.queued >= MAX_QUEUE:
+                return False
+            self.queued += 1
+            return True
+
+    def leave(self, seconds, stages=None):
+        with self.lock:
+            self.queued -= 1
+            if stages is None:
+                self.failed += 1
+                return
+            self.served += 1
+            self.latencies.append(seconds)
+            for name, stage_seconds in stages.items():
+                self.stages[name] = self.stages.get(name, 0) + stage_seconds
+
+    def report(self, workers):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stages = {name: round(seconds, 3) for name, seconds in self.stages.items()}
+            report = {"status": "ok", "workers": workers, "queue_depth": self.queued, "max_queue": MAX_QUEUE,
+                      "served": self.served, "failed": self.failed, "stage_seconds": stages}
+        if latencies:
+            report["latency_seconds"] = {
+                "count": len(latencies),
+                "mean": round(sum(latencies) / len(latencies), 4),
+                "p50": round(latencies[len(latencies) // 2], 4),
+                "p95": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], 4),
+                "max": round(latencies[-1], 4),
+            }
+        return report
+
+
+class RollRequestHandler(BaseHTTPRequestHandler):
+    server_version = "RollServer/1.0"
+
+    def send_json(self, status, data):
+        body = json.dumps(data, indent=2).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_roll(self, filename, seconds):
+        extension = os.path.splitext(filename)[1]
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES.get(extension, "application/octet-stream"))
+        if extension == ".svgz":
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(os.path.getsize(filename)))
+        self.send_header("Content-Disposition", f'attachment; filename="roll{extension}"')
+        self.send_header("X-Render-Seconds", f"{seconds:.3f}")
+        self.end_headers()
+        with open(filename, "rb") as f:
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path in ("/health", "/metrics"):
+            self.send_json(200, self.server.stats.report(self.server.workers))
+        else:
+            self.send_json(404, {"error": "not found, use POST /convert or GET /health"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/convert":
+            self.send_json(404, {"error": "not found, use POST /convert or GET /health"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length <= 0:
+                raise BadRequest("send the MIDI file as the request body")
+            if length > MAX_UPLOAD_BYTES:
+                self.send_json(413, {"error": f"MIDI files are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"})
+                return
+            profile, options = request_settings(url.query)
+        except (BadRequest, ValueError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        midi_data = self.rfile.read(length)
+        stats = self.server.stats
+        if not stats.enter():
+            self.send_json(503, {"error": "too many requests waiting, try again shortly"})
+            return
+
+        start = time.perf_counter()
+        stages = None
+        work_dir = tempfile.mkdtemp(prefix="rollserver_")
+        try:
+            midi_file = os.path.join(work_dir, "upload.mid")
+            with open(midi_file, "wb") as f:
+                f.write(midi_data)
+            try:
+                convert = partial(render_upload, profile=profile, options=options)
+                (filename, stages), _ = self.server.pool.submit(convert_quietly, convert, midi_file).result()
+            except Exception as e:
+                self.send_json(422, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self.send_roll(filename, time.perf_counter() - start)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            stats.leave(time.perf_counter() - start, stages)
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}")
+
+
+def serve(host=HOST, port=PORT, workers=None):
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        server = ThreadingHTTPServer((host, port), RollRequestHandler)
+        server.pool = pool
+        server.workers = workers
+        server.stats = ServiceStats()
+        print(f"Roll service on http://{host}:{port} with {workers} worker processes. Ctrl+C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Stopping.")
+        finally:
+            server.server_close()
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve roll conversions over HTTP: POST a MIDI file to /convert, GET /health for the status.")
+    parser.add_argument("--host", default=HOST, help="address to listen on, 0.0.0.0 for all computers on the network (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    args = parser.parse_args()
+    try:
+        serve(args.host, args.port, args.workers)
+    except OSError as e:
+        sys.exit(f"Can't start the service on {args.host}:{args.port}: {e}")
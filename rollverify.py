@@ -0,0 +1,262 @@
+import gzip
+import json
+import os
+import re
+import sys
+import argparse
+import xml.etree.ElementTree as ElementTree
+import numpy as np
+import rollengine
+import multiroll
+
+# Checks a finished roll against the MIDI file it was made from, before it goes to the cutter. The holes
+# are read back from the svg (any SVG_STYLE, .svgz too) or taken from the geometry the scripts draw, and
+# turned back into notes: the hole's x gives the row (with the sustain note's shift taken off), its y and
+# length give the start and end (with the bridges of long notes joined up again and the note shortening
+# added back). The coordinates are read inside the mirrored group, so the mirroring needs no undoing.
+# The notes are then compared with the notes parsed from the MIDI file:
+#   dropped     a note of the MIDI file that has no hole (zero length, or shortened to nothing)
+#   mismatched  a hole on the right row that starts or ends somewhere else than the note
+#   extra       a hole that belongs to no note at all
+#   merged      notes on the same row that touch or overlap and are cut as one hole
+# The svg has to have been made with the instrument settings as they are now, and be a whole roll (not tiled).
+
+STEP_TOLERANCE = 0.05  # How far (in time steps) a hole may be off before it counts as mismatched
+ROW_TOLERANCE = 0.05  # Same for the position across the roll, in svg units
+SVG_NAMESPACE = "{http://www.w3.org/2000/svg}"
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+# One rounded hole outline of svgstream.hole_outline, with the move to its start in front
+HOLE_PATH = re.compile(r"([Mm])(-?[\d.]+) (-?[\d.]+)h([\d.]+)a([\d.]+) [^v]*v([\d.]+)")
+
+
+def outline_size(d):
+    """Width and height of the hole outline in a path, from its side, corner and length."""
+    _, _, _, side, radius, length = HOLE_PATH.match(d).groups()
+    return float(side) + 2 * float(radius), float(length) + 2 * float(radius)
+
+
+def read_svg_holes(svg_file):
+    """Page height and the x, y, width and height arrays of every hole in the svg, each hole once."""
+    opener = gzip.open if svg_file.endswith(".svgz") else open
+    with opener(svg_file, "rb") as f:
+        root = ElementTree.parse(f).getroot()
+
+    holes = []
+    shapes = {}
+    for path in root.iter(SVG_NAMESPACE + "path"):
+        if path.get("id"):  # Hole shape of the "shapes" style, placed by <use>
+            shapes["#" + path.get("id")] = outline_size(path.get("d"))
+            continue
+        # "paths" style, every hole moves relative to the previous one
+        hole_x = hole_y = 0.0
+        for move, x, y, side, radius, length in HOLE_PATH.findall(path.get("d")):
+            if move == "M":
+                hole_x, hole_y = float(x), float(y)
+            else:
+                hole_x, hole_y = hole_x + float(x), hole_y + float(y)
+            radius = float(radius)
+            holes.append((hole_x - radius, hole_y, float(side) + 2 * radius, float(length) + 2 * radius))
+    for use in root.iter(SVG_NAMESPACE + "use"):
+        shape = shapes.get(use.get(XLINK_HREF))
+        if shape is not None:
+            holes.append((float(use.get("x")), float(use.get("y")), shape[0], shape[1]))
+    for rect in root.iter(SVG_NAMESPACE + "rect"):
+        holes.append(tuple(float(rect.get(name)) for name in ("x", "y", "width", "height")))
+
+    holes = np.unique(np.array(holes, dtype=float).reshape(-1, 4), axis=0)  # Double cutting draws every hole twice
+    holes = holes[holes[:, 3] > 0]  # A hole without length isn't cut
+    return float(root.get("height")), tuple(holes.T)
+
+
+def geometry_holes(geometry):
+    x, y, width, height = geometry.holes[:4]
+    keep = height > 0
+    return geometry.height, (x[keep], y[keep], width[keep], height[keep])
+
+
+def source_runs(notes, profile):
+    """The profile's notes, the runs they should be cut as and the number of notes in each run."""
+    table, min_duration = rollengine.profile_notes(notes, profile)
+    runs = rollengine.note_runs(table)
+    notes_per_run = np.bincount(rollengine.run_of_notes(table, runs), minlength=len(runs[0]))
+    return table, min_duration, runs, notes_per_run
+
+
+def decode_runs(total_height, holes, profile, min_duration):
+    """Turn holes back into runs: row, start and end step (as floats) and whether each sits on a row."""
+    sf = rollengine.SCALING_FACTOR
+    note_height = profile.note_height * sf
+    step_length = profile.base_length_mm * sf / min_duration
+    rect_x, rect_y, width, height = holes
+    if len(rect_x) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), np.zeros(0, dtype=bool)
+
+    # Where the holes of every row are, the same formula hole_geometry places them with
+    row_x = np.arange(len(profile.notes)) * (note_height + profile.vertical_gap * sf) + profile.note_vertical_offset * sf + sf
+    if profile.sustain_note in profile.notes:
+        row_x[profile.notes.index(profile.sustain_note)] -= note_height / profile.sustain_adjust
+    right_cut_line_x = 5 * sf + profile.paper_width * sf
+    hole_row_x = right_cut_line_x - rect_x - note_height
+    order = np.argsort(row_x)
+    nearest = np.clip(np.searchsorted(row_x[order], hole_row_x), 1, len(row_x) - 1)
+    nearest -= hole_row_x - row_x[order][nearest - 1] < row_x[order][nearest] - hole_row_x
+    rows = order[nearest]
+    on_row = (np.abs(row_x[rows] - hole_row_x) <= ROW_TOLERANCE) & (np.abs(width - note_height) <= ROW_TOLERANCE)
+
+    # Parts of a long note follow each other one bridge apart, every part after the first is threshold long
+    part_start = total_height - rect_y - height
+    part_end = part_start + height
+    order = np.lexsort((part_start, rows))
+    rows, part_start, part_end, height, on_row = rows[order], part_start[order], part_end[order], height[order], on_row[order]
+    bridged = np.zeros(len(rows), dtype=bool)
+    bridged[1:] = (
+        (rows[1:] == rows[:-1])
+        & (np.abs(part_start[1:] - part_end[:-1] - profile.bridge_width * sf) <= ROW_TOLERANCE)
+        & (np.abs(height[1:] - profile.long_note_threshold * sf) <= ROW_TOLERANCE)
+    )
+    first = np.flatnonzero(~bridged)
+    last = np.append(first[1:], len(rows)) - 1
+    run_on_row = np.logical_and.reduceat(on_row, first) if len(first) else on_row
+
+    blank_space = profile.blank_space * sf
+    starts = (part_start[first] - blank_space) / step_length
+    ends = (part_end[last] + profile.note_shortening * sf - blank_space) / step_length
+    return rows[first], starts, ends, run_on_row
+
+
+def triples_in(triples, others):
+    """For every (row, start, end) line of the triples array, whether it is among the lines of others."""
+    _, inverse = np.unique(np.concatenate((triples, others)), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    return np.isin(inverse[:len(triples)], inverse[len(triples):])
+
+
+def last_below(rows, values, query_rows, query_values):
+    """For every query, the index of the last (row, value) pair that sorts below it (-1 for none).
+
+    The pairs have to be sorted by row and value, like np.searchsorted(..., side="left") - 1 on both at once.
+    """
+    is_pair = np.concatenate((np.ones(len(rows), dtype=bool), np.zeros(len(query_rows), dtype=bool)))
+    order = np.lexsort((is_pair, np.concatenate((values, query_values)), np.concatenate((rows, query_rows))))  # Queries before equal pairs
+    below = np.cumsum(is_pair[order]) - 1
+    index = np.empty(len(query_rows), dtype=np.int64)
+    index[order[~is_pair[order]] - len(rows)] = below[~is_pair[order]]
+    return index
+
+
+def compare_runs(expected, decoded):
+    """Pair decoded runs with the expected ones. Returns the indices of mismatched pairs, dropped and extra runs."""
+    rows, starts, ends = expected
+    hole_rows, hole_starts, hole_ends, on_row = decoded
+    whole_starts, whole_ends = np.rint(hole_starts).astype(np.int64), np.rint(hole_ends).astype(np.int64)
+    on_grid = on_row & (np.abs(hole_starts - whole_starts) <= STEP_TOLERANCE) & (np.abs(hole_ends - whole_ends) <= STEP_TOLERANCE)
+
+    # Exact matches first, whole (row, start, end) triples, compared as they are so no step count is too big
+    expected_runs = np.stack((rows, starts, ends), axis=1)
+    hole_runs = np.stack((hole_rows, whole_starts, whole_ends), axis=1)
+    matched = triples_in(expected_runs, hole_runs[on_grid])
+    exact = np.zeros(len(hole_rows), dtype=bool)
+    exact[on_grid] = triples_in(hole_runs[on_grid], expected_runs)
+
+    # The rest are paired with an unmatched run on the same row they overlap with
+    left = np.flatnonzero(~matched)
+    candidates = np.flatnonzero(~exact)
+    index = last_below(rows[left], starts[left], hole_rows[candidates], np.ceil(hole_ends[candidates]))
+    found = index >= 0
+    pair = left[np.maximum(index, 0)]
+    found &= (rows[pair] == hole_rows[candidates]) & (ends[pair] > hole_starts[candidates])
+    mismatched = np.stack([pair[found], candidates[found]], axis=1)
+    dropped = np.setdiff1d(left, pair[found])
+    extra = candidates[~found]
+    return mismatched, dropped, extra
+
+
+def verify(midi_file, profile, svg_file=None, options=multiroll.OPTIONS, time_step=multiroll.TIME_STEP):
+    """Compare the roll (svg_file, or the geometry the settings give if None) with the MIDI file. Returns a report dict."""
+    notes = rollengine.parse_midi(midi_file, time_step)
+    table, min_duration, expected, notes_per_run = source_runs(notes, profile)
+    if svg_file is None:
+        total_height, holes = geometry_holes(rollengine.hole_geometry(table, min_duration, profile, options))
+    else:
+        total_height, holes = read_svg_holes(svg_file)
+    decoded = decode_runs(total_height, holes, profile, min_duration)
+    mismatched, dropped, extra = compare_runs(expected, decoded)
+
+    # Notes of the profile that never made it into the note table
+    on_roll = np.isin(notes.rows, profile.notes)
+    zero_length = on_roll & (notes.starts >= notes.ends)
+
+    step_mm = profile.base_length_mm / min_duration
+    rows, starts, ends = expected
+
+    def note(row, start, end):
+        return {"note": int(profile.notes[int(row)]), "start_step": round(float(start), 2), "end_step": round(float(end), 2),
+                "position_mm": round(float(start) * step_mm + profile.blank_space, 1)}
+
+    merged_runs = np.flatnonzero(notes_per_run > 1)
+    report = {
+        "midi_file": midi_file,
+        "roll": svg_file or "geometry",
+        "instrument": profile.name,
+        "notes": int(on_roll.sum()),
+        "holes": len(holes[0]),
+        "runs": len(rows),
+        "mismatched": [dict(expected=note(rows[i], starts[i], ends[i]), hole=note(decoded[0][j], decoded[1][j], decoded[2][j]))
+                       for i, j in mismatched.tolist()],
+        "dropped": [dict(note(rows[i], starts[i], ends[i]), reason="no hole") for i in dropped.tolist()]
+                   + [dict(note(profile.notes.index(row), start, end), reason="zero length")
+                      for row, start, end in zip(notes.rows[zero_length].tolist(), notes.starts[zero_length].tolist(), notes.ends[zero_length].tolist())],
+        "extra": [note(decoded[0][j], decoded[1][j], decoded[2][j]) for j in extra.tolist()],
+        "merged": [dict(note(rows[i], starts[i], ends[i]), merged_notes=int(notes_per_run[i])) for i in merged_runs.tolist()],
+    }
+    report["ok"] = not (report["mismatched"] or report["dropped"] or report["extra"])
+    return report
+
+
+def print_report(report):
+    print(f"{report['roll']}: {report['notes']} notes, {report['runs']} runs, {report['holes']} holes.")
+    for kind in ("mismatched", "dropped", "extra", "merged"):
+        if report[kind]:
+            print(f"  {len(report[kind])} {kind}:")
+            for entry in report[kind]:
+                print(f"    {entry}")
+    print("  Roll matches the MIDI file." if report["ok"] else "  Roll does NOT match the MIDI file.")
+
+
+def roll_file_name(midi_file, profile):
+    """The svg the scripts write for the MIDI file, .svgz if that is what is there."""
+    base = os.path.splitext(midi_file)[0] + profile.output_suffix
+    return base + ".svgz" if os.path.exists(base + ".svgz") and not os.path.exists(base + ".svg") else base + ".svg"
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read the holes back from roll svgs and check them against their MIDI files.")
+    parser.add_argument("midi_files", nargs="+", help="MIDI files to check, the roll is the svg the scripts write next to each")
+    parser.add_argument("--instrument", choices=list(multiroll.PROFILES), default="piano", help="instrument the rolls were made for (default: %(default)s)")
+    parser.add_argument("--svg", help="roll svg to check, when it isn't next to the (single) MIDI file")
+    parser.add_argument("--geometry", action="store_true", help="check the holes the current settings draw instead of reading an svg")
+    parser.add_argument("--json", metavar="FILE", help="write all reports to FILE")
+    args = parser.parse_args()
+    if args.svg and len(args.midi_files) > 1:
+        sys.exit("--svg only works with a single MIDI file.")
+
+    profile = multiroll.PROFILES[args.instrument]
+    reports = []
+    for midi_file in args.midi_files:
+        svg_file = None if args.geometry else args.svg or roll_file_name(midi_file, profile)
+        try:
+            report = verify(midi_file, profile, svg_file)
+        except Exception as e:
+            report = {"midi_file": midi_file, "roll": svg_file, "ok": False, "error": f"{type(e).__name__}: {e}"}
+            print(f"{midi_file}: {report['error']}")
+        else:
+            print_report(report)
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Reports written to {args.json}")
+    sys.exit(0 if all(report["ok"] for report in reports) else 1)
@@ -11,6 +11,10 @@ echo 1 - Check overlap
 echo 2 - Midi to Piano Roll
 echo 3 - Sustain add
 echo 4 - Midi to 20 note organ
+echo 5 - Batch: folder to piano rolls
+echo 6 - Batch: folder to 20 note organ rolls
+echo 7 - Midi to piano and organ roll
+echo 8 - Watch a folder for new midi files
 echo 0 - Exit to command prompt
 echo ========================================
 set /p choice="Enter your choice: "
@@ -24,6 +28,18 @@ if "%choice%"=="1" (
     python sustainadd.py
 ) else if "%choice%"=="4" (
     python miditoorgan.py
+) else if "%choice%"=="5" (
+    set /p folder="Enter the folder with the midi files: "
+    call python miditoroll.py --batch "%%folder%%"
+) else if "%choice%"=="6" (
+    set /p folder="Enter the folder with the midi files: "
+    call python miditoorgan.py --batch "%%folder%%"
+) else if "%choice%"=="7" (
+    python multiroll.py
+) else if "%choice%"=="8" (
+    set /p folder="Enter the folder to watch: "
+    set /p outfolder="Enter the folder for the results: "
+    call python watchfolder.py "%%folder%%" "%%outfolder%%" --steps piano
 ) else if "%choice%"=="0" (
     goto end
 ) else (
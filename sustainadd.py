@@ -1,67 +1,85 @@
-import mido
+import os
+import sys
+import argparse
 
-input_midi_file = input("Enter the name of the MIDI file (excluding .mid extension): ") + ".mid"  # Name of the MIDI file
+# Adds note 18 (the sustain pedal hole on the roll) for as long as control 64 (sustain pedal) is down.
+# Each track is copied in one pass with the sustain notes put in right after the pedal changes, so
+# nothing needs sorting. The result goes to a new file next to the original.
 
+SUSTAIN_NOTE = 18  # Note that is played while the pedal is down
+OUTPUT_SUFFIX = "_sustain"  # Added to the file name of the modified MIDI file
 
+def sustain_track(track, sustain_note=SUSTAIN_NOTE):
+    """Yield the messages of the track with sustain_note on while the pedal is down."""
+    import mido
 
-def add_sustain_note_with_controls(filename):
-    # Load the MIDI file
-    midi = mido.MidiFile(filename)
-    new_tracks = []
-
-    for track in midi.tracks:
-        # Step 1: Convert delta times to absolute times
-        events = []
-        running_time = 0
-        for msg in track:
-            running_time += msg.time
-            events.append((running_time, msg))
+    sustain_on = False
+    for msg in track:
+        if msg.type == 'end_of_track' and sustain_on:
+            # Pedal still down at the end of the track, let go of the note right before the track ends
+            yield mido.Message('note_off', note=sustain_note, velocity=1, time=msg.time)
+            msg = msg.copy(time=0)
+            sustain_on = False
 
-        # Step 2: Process events to add sustain notes
-        new_events = []
-        sustain_on = False
-        sustain_note_start_time = 0
+        yield msg
 
-        for abs_time, msg in events:
-            # Add the original message
-            new_events.append((abs_time, msg))
+        # Check for sustain pedal control changes, the note goes in at the same time as the pedal
+        if msg.type == 'control_change' and msg.control == 64:
+            if msg.value > 0 and not sustain_on:  # Sustain pedal pressed
+                sustain_on = True
+                yield mido.Message('note_on', note=sustain_note, velocity=1, time=0)
+            elif msg.value == 0 and sustain_on:  # Sustain pedal released
+                sustain_on = False
+                yield mido.Message('note_off', note=sustain_note, velocity=1, time=0)
 
-            # Check for sustain pedal control changes
-            if msg.type == 'control_change' and msg.control == 64:
-                if msg.value > 0 and not sustain_on:  # Sustain pedal pressed
-                    sustain_on = True
-                    sustain_note_start_time = abs_time
-                    # Add Note On for note 18 with velocity 1
-                    new_events.append((abs_time, mido.Message('note_on', note=18, velocity=1, time=0)))
-                elif msg.value == 0 and sustain_on:  # Sustain pedal released
-                    sustain_on = False
-                    # Add Note Off for note 18
-                    sustain_duration = abs_time - sustain_note_start_time
-                    new_events.append((abs_time, mido.Message('note_off', note=18, velocity=1, time=0)))
-                    sustain_note_start_time = 0
+    if sustain_on:  # Track without an end_of_track
+        yield mido.Message('note_off', note=sustain_note, velocity=1, time=0)
 
-        # If sustain was left on at the end of the track, turn off the note
-        if sustain_on:
-            sustain_duration = running_time - sustain_note_start_time
-            new_events.append((running_time, mido.Message('note_off', note=18, velocity=1, time=0)))
+def sustain_file_name(filename):
+    base, extension = os.path.splitext(filename)
+    return base + OUTPUT_SUFFIX + extension
 
-        # Step 3: Convert absolute times back to delta times
-        new_track = mido.MidiTrack()
-        prev_time = 0
-        for abs_time, msg in sorted(new_events, key=lambda x: x[0]):
-            msg.time = abs_time - prev_time
-            prev_time = abs_time
-            new_track.append(msg)
+def add_sustain_note_with_controls(filename, output_file=None):
+    """Write a copy of the MIDI file with the sustain note added, returns the output file name."""
+    import mido
 
-        new_tracks.append(new_track)
+    output_file = output_file or sustain_file_name(filename)
+    midi = mido.MidiFile(filename)
+    new_midi = mido.MidiFile(type=midi.type, ticks_per_beat=midi.ticks_per_beat)
+    new_midi.tracks.extend(mido.MidiTrack(sustain_track(track)) for track in midi.tracks)
 
-    # Create a new MIDI file with the modified tracks
-    new_midi = mido.MidiFile()
-    new_midi.tracks.extend(new_tracks)
+    # Write to a temporary file first so nothing ever sees a half written file
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        new_midi.save(temp_file)
+        os.replace(temp_file, output_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    print(f"Modified MIDI file saved as {output_file}")
+    return output_file
 
-    # Save the modified MIDI file, overwriting the original
-    new_midi.save(filename)
-    print(f"Modified MIDI file saved and overwritten as {filename}")
 
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add the sustain note to MIDI files wherever the sustain pedal is down.")
+    parser.add_argument("midi_files", nargs="*", help="MIDI files to add the sustain note to (asks for one if none are given)")
+    parser.add_argument("--output-dir", help=f"folder to write the modified files to (default: next to the original, with {OUTPUT_SUFFIX} added to the name)")
+    args = parser.parse_args()
 
-add_sustain_note_with_controls(input_midi_file)
+    midi_files = args.midi_files or [input("Enter the name of the MIDI file (excluding .mid extension): ") + ".mid"]
+    failed = 0
+    for midi_file in midi_files:
+        output_file = None
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            output_file = os.path.join(args.output_dir, os.path.basename(midi_file))
+            if os.path.abspath(output_file) == os.path.abspath(midi_file):
+                output_file = sustain_file_name(output_file)  # Never overwrite the original
+        try:
+            add_sustain_note_with_controls(midi_file, output_file)
+        except Exception as e:
+            print(f"{midi_file} failed: {type(e).__name__}: {e}")
+            failed += 1
+    sys.exit(1 if failed else 0)
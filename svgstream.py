@@ -0,0 +1,234 @@
+import gzip
+import os
+from collections import deque
+from functools import partial
+from itertools import chain, groupby, islice
+import numpy as np
+
+# Writes svg elements to the file as they are drawn, instead of building an svgwrite Drawing in memory
+# and saving it at the end. Takes the same dwg.line / dwg.rect / group.add calls the scripts use and
+# writes the same markup svgwrite would, so the geometry in the file is identical. The file is written
+# under a temporary name and only gets its own name once it is complete, like dwg.save() never leaves
+# half a roll behind; abort() throws the temporary file away when drawing fails.
+
+SVG_HEADER = (
+    '<?xml version="1.0" encoding="utf-8" ?>\n'
+    '<svg baseProfile="full" height="{height}" version="1.1" width="{width}" xmlns="http://www.w3.org/2000/svg" '
+    'xmlns:ev="http://www.w3.org/2001/xml-events" xmlns:xlink="http://www.w3.org/1999/xlink"><defs />'
+)
+BUFFER_SIZE = 1 << 16  # Characters collected before they're written to the file
+
+
+def element(tag, **attributes):
+    # svgwrite writes attributes sorted by name, with underscores as dashes
+    attributes = sorted((name.replace("_", "-"), value) for name, value in attributes.items())
+    return "<" + tag + "".join(f' {name}="{value}"' for name, value in attributes) + " />"
+
+
+class StreamingSVG:
+    def __init__(self, filename, size, compress=False, buffer_size=BUFFER_SIZE):
+        self.filename = filename
+        self.temp_filename = f"{filename}.{os.getpid()}.tmp"
+        self.file = gzip.open(self.temp_filename, "wb") if compress else open(self.temp_filename, "wb")
+        self.buffer = []
+        self.buffered = 0
+        self.buffer_size = buffer_size
+        self.open_groups = 0
+        self.bytes_written = 0
+        width, height = size
+        self.write(SVG_HEADER.format(width=width, height=height))
+
+    def line(self, start, end, **attributes):
+        (x1, y1), (x2, y2) = start, end
+        return element("line", x1=x1, y1=y1, x2=x2, y2=y2, **attributes)
+
+    def rect(self, insert, size, **attributes):
+        (x, y), (width, height) = insert, size
+        return element("rect", x=x, y=y, width=width, height=height, **attributes)
+
+    def g(self, transform=None):
+        # The group is opened right away, so its transform has to be known before anything is drawn into it
+        self.write(f'<g transform="{transform}">' if transform else "<g>")
+        self.open_groups += 1
+        return self
+
+    def add(self, markup):
+        self.write(markup)
+
+    def write(self, markup):
+        self.buffer.append(markup)
+        self.buffered += len(markup)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        data = "".join(self.buffer).encode("utf-8")
+        self.file.write(data)
+        self.bytes_written += len(data)
+        self.buffer = []
+        self.buffered = 0
+
+    def close(self):
+        self.write("</g>" * self.open_groups + "</svg>")
+        self.open_groups = 0
+        self.flush()
+        self.file.close()
+        os.replace(self.temp_filename, self.filename)
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.temp_filename):
+            os.remove(self.temp_filename)
+
+
+def line_of(segment):
+    """(vertical, x or y) of the straight line a cut line segment lies on."""
+    (x1, y1), (x2, y2) = segment
+    return (True, x1) if x1 == x2 else (False, y1)
+
+
+def cut_line_paths(cut_lines, **attributes):
+    """One <path> per cut line instead of a <line> per segment, the segments keep their exact coordinates."""
+    for (vertical, _), segments in groupby(cut_lines, key=line_of):
+        if vertical:
+            d = "".join(f"M{x1} {y1}V{y2}" for (x1, y1), (_, y2) in segments)
+        else:
+            d = "".join(f"M{x1} {y1}H{x2}" for (x1, y1), (x2, _) in segments)
+        yield element("path", d=d, **attributes)
+
+
+# Hole markup in chunks. The markup of every hole only depends on that hole (and, for "paths", on the
+# holes before it on the same row), so the holes are cut into chunks of CHUNK_HOLES in drawing order and
+# each chunk's markup is written to the file as soon as it is made, never the markup of the whole roll
+# at once. With more workers the chunks are made on a pool of processes, a few at a time per worker,
+# and written in the same order. The file comes out exactly the same either way.
+
+CHUNK_HOLES = 10000  # Holes whose markup is made (and held in memory) at once
+CHUNKS_IN_FLIGHT = 2  # Chunks handed to every worker ahead of the one being written
+
+
+def chunk_slices(length, boundaries=None, chunk_holes=CHUNK_HOLES):
+    """Yield slices cutting length items into chunks of chunk_holes, or just past that at the next boundary (sorted indices) if given."""
+    start = 0
+    while start < length:
+        end = min(start + chunk_holes, length)
+        if boundaries is not None and end < length:
+            next_boundary = np.searchsorted(boundaries, end)
+            end = int(boundaries[next_boundary]) if next_boundary < len(boundaries) else length
+        yield slice(start, end)
+        start = end
+
+
+def render_chunks(function, arrays, slices, workers=1):
+    """Yield function(*chunk of arrays) for every slice in order, on a pool of worker processes if workers > 1."""
+    slices = iter(slices)
+    first = list(islice(slices, 2))
+    if workers <= 1 or len(first) <= 1:
+        for piece in chain(first, slices):
+            yield function(*(values[piece] for values in arrays))
+        return
+    from concurrent.futures import ProcessPoolExecutor  # Only loaded when there is more than one worker
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for piece in chain(first, slices):
+            if len(pending) >= workers * CHUNKS_IN_FLIGHT:
+                yield pending.popleft().result()
+            pending.append(pool.submit(function, *(values[piece] for values in arrays)))
+        while pending:
+            yield pending.popleft().result()
+
+
+def rect_markup(rect_x, rect_y, width, height, radius, passes=1):
+    """A <rect> for every hole, passes times in a row, the same as dwg.rect writes them."""
+    markup = []
+    for x, y, w, h, r in zip(rect_x.tolist(), rect_y.tolist(), width.tolist(), height.tolist(), radius.tolist()):
+        markup += [element("rect", x=x, y=y, width=w, height=h, fill="black", rx=r, ry=r)] * passes
+    return markup
+
+
+# Compact hole output. Holes are rounded rects; instead of a <rect> per hole (and another one per extra
+# cutting pass) they can be written as one compound <path> per note row ("paths"), or as one <path> per
+# distinct hole size in <defs> placed with <use> ("shapes"). Either way the holes are drawn once in a
+# group, and every extra cutting pass is a single <use> of that group.
+
+PRECISION = 1000  # Path coordinates are rounded to 1/1000 svg unit
+
+
+def number(value):
+    # value is in 1/PRECISION units
+    return f"{value / PRECISION:.3f}".rstrip("0").rstrip(".") if value % PRECISION else str(value // PRECISION)
+
+
+def hole_outline(width, height, radius):
+    """Relative path commands for a rounded rect, starting and ending at the top edge after the first corner."""
+    radius = min(radius, width // 2, height // 2)
+    r, side, length = number(radius), number(width - 2 * radius), number(height - 2 * radius)
+    return (
+        f"h{side}a{r} {r} 0 0 1 {r} {r}v{length}a{r} {r} 0 0 1 -{r} {r}"
+        f"h-{side}a{r} {r} 0 0 1 -{r} -{r}v-{length}a{r} {r} 0 0 1 {r} -{r}z"
+    )
+
+
+def row_paths(x, y, w, h, r, rows):
+    """One compound path per row, each hole moves relative to the start of the previous one."""
+    x, y, w, h, r, rows = (values.tolist() for values in (x, y, w, h, r, rows))
+    outlines = {}
+    paths = []
+    for _, holes in groupby(range(len(rows)), key=rows.__getitem__):
+        d = []
+        for i in holes:
+            shape = (w[i], h[i], r[i])
+            if shape not in outlines:
+                outlines[shape] = hole_outline(*shape)
+            hole_x, hole_y = x[i] + min(r[i], w[i] // 2, h[i] // 2), y[i]
+            if d:
+                d.append(f"m{number(hole_x - previous_x)} {number(hole_y - previous_y)}")
+            else:
+                d.append(f"M{number(hole_x)} {number(hole_y)}")
+            d.append(outlines[shape])
+            previous_x, previous_y = hole_x, hole_y
+        paths.append(f'<path d="{"".join(d)}" />')
+    return paths
+
+
+def shape_uses(x, y, shape_index, shape_ids):
+    return [f'<use x="{number(hole_x)}" xlink:href="#{shape_ids[shape]}" y="{number(hole_y)}" />'
+            for hole_x, hole_y, shape in zip(x.tolist(), y.tolist(), shape_index.tolist())]
+
+
+def compact_holes(style, rect_x, rect_y, width, height, radius, rows, passes=1, workers=1):
+    """Yield svg markup for all holes in the given style ("paths" or "shapes"), written on workers processes."""
+    # Work in whole 1/PRECISION units so relative moves don't add up rounding errors
+    keep = height > 0
+    x, y, w, h, r = (np.rint(values[keep] * PRECISION).astype(np.int64) for values in (rect_x, rect_y, width, height, radius))
+    rows = rows[keep]
+
+    yield '<g fill="black" id="holes">'
+    if style == "paths":
+        # Chunks only end where a new row starts, every path stays whole
+        slices = chunk_slices(len(rows), np.flatnonzero(rows[1:] != rows[:-1]) + 1)
+        for paths in render_chunks(row_paths, (x, y, w, h, r, rows), slices, workers):
+            yield from paths
+    elif style == "shapes":
+        # Every distinct hole size is defined once, holes are placed copies of it
+        shapes, first, inverse = np.unique(np.stack((w, h, r), axis=1), axis=0, return_index=True, return_inverse=True)
+        order = np.argsort(first)  # Numbered in the order they first appear
+        number_of = np.empty(len(order), dtype=np.int64)
+        number_of[order] = np.arange(len(order))
+        shape_index = number_of[inverse.reshape(-1)]
+        shape_ids = [f"hole{i}" for i in range(len(order))]
+        yield "<defs>"
+        for i, (hole_w, hole_h, hole_r) in enumerate(shapes[order].tolist()):
+            corner = min(hole_r, hole_w // 2, hole_h // 2)
+            yield f'<path d="M{number(corner)} 0{hole_outline(hole_w, hole_h, hole_r)}" id="{shape_ids[i]}" />'
+        yield "</defs>"
+        uses = partial(shape_uses, shape_ids=shape_ids)
+        for markup in render_chunks(uses, (x, y, shape_index), chunk_slices(len(x)), workers):
+            yield from markup
+    else:
+        raise ValueError(f"Unknown svg style '{style}'")
+    yield "</g>"
+
+    # Extra cutting passes go over the same holes again
+    for _ in range(passes - 1):
+        yield '<use xlink:href="#holes" />'
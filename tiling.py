@@ -0,0 +1,110 @@
+import math
+import os
+import numpy as np
+
+# Splits a roll that is longer than the cutter bed into sheets. Sheets are counted from the start of
+# the roll (the bottom of the svg) and overlap by a bit; registration marks in the middle of each
+# overlap show up on both sheets so they can be lined up. Every hole is cut on exactly one sheet, the
+# first one it fits on completely. Holes are never longer than a long note part plus a bridge, so with
+# an overlap longer than that nothing needs splitting; anything longer is cut square at the sheet edge.
+# Cut line segments are split halfway through the overlap. Sheets are drawn and written one at a time,
+# but from the geometry of the whole roll: the holes and cut line segments of the full roll are worked
+# out (and cached) first, only the files are made per sheet. That geometry is some 50 bytes per hole,
+# small next to writing a roll-length svg, but it does grow with the length of the roll.
+
+MARK_SIZE_MM = 4  # Size of the registration crosses
+MARK_MARGIN_MM = 2.5  # Distance of the registration crosses outside the cut lines
+
+
+def tile_count(length, tile_length, overlap):
+    if length <= tile_length:
+        return 1
+    return math.ceil((length - tile_length) / (tile_length - overlap)) + 1
+
+
+def assign_holes(holes, roll_height, tile_length, step, count):
+    """Sheet index for every hole, plus the pieces of holes that don't fit on any single sheet."""
+    rect_x, rect_y, width, height, radius, rows = holes
+    start = roll_height - rect_y - height  # Distance from the start of the roll
+    end = roll_height - rect_y
+    sheet = np.clip(np.ceil((end - tile_length) / step), 0, count - 1).astype(np.int64)
+    fits = start >= sheet * step
+
+    pieces = []
+    for i in np.flatnonzero(~fits).tolist():
+        piece_start = start[i]
+        while piece_start < end[i]:
+            piece_sheet = min(int(piece_start // step), count - 1)
+            piece_end = min(end[i], piece_sheet * step + tile_length)
+            pieces.append((piece_sheet, rect_x[i], roll_height - piece_end, width[i], piece_end - piece_start, rows[i]))
+            piece_start = piece_end
+    return sheet, fits, pieces
+
+
+def roll_tiles(geometry, tile_length, overlap):
+    """Yield (sheet geometry, registration mark lines) for every sheet, in svg units like the geometry."""
+    if not 0 <= overlap < tile_length:
+        raise ValueError("The sheet overlap has to be shorter than the sheet")
+
+    roll_height = geometry.height
+    step = tile_length - overlap
+    count = tile_count(roll_height, tile_length, overlap)
+    scale = geometry.scaling_factor
+
+    sheet_of_hole, fits, pieces = assign_holes(geometry.holes, roll_height, tile_length, step, count)
+    if pieces:
+        print(f"{len(pieces)} hole pieces were cut square at a sheet edge, make the sheet overlap longer to avoid this.")
+    order = np.argsort(np.where(fits, sheet_of_hole, count), kind="stable")  # Keeps the cutting order within a sheet
+    bounds = np.searchsorted(np.where(fits, sheet_of_hole, count)[order], np.arange(count + 1))
+
+    vertical_x = [start[0] for start, end in geometry.cut_lines if start[0] == end[0]]
+    left_x, right_x = min(vertical_x, default=0), max(vertical_x, default=geometry.width)
+
+    for sheet in range(count):
+        sheet_start = sheet * step
+        sheet_end = min(sheet_start + tile_length, roll_height)
+        top = roll_height - sheet_end  # Svg y of the top of this sheet
+
+        # Holes on this sheet, moved up to the top of the sheet
+        index = order[bounds[sheet]:bounds[sheet + 1]]
+        holes = [values[index] for values in geometry.holes]
+        sheet_pieces = [piece[1:] for piece in pieces if piece[0] == sheet]
+        if sheet_pieces:
+            piece_x, piece_y, piece_width, piece_height, piece_rows = (np.array(values) for values in zip(*sheet_pieces))
+            extra = (piece_x, piece_y, piece_width, piece_height, np.zeros(len(piece_x)), piece_rows)
+            holes = [np.concatenate((values, more)) for values, more in zip(holes, extra)]
+        holes[1] = holes[1] - top
+
+        # Cut line segments in this sheet's part of the roll, overlaps are split down the middle
+        own_start = sheet_start + overlap / 2 if sheet > 0 else 0
+        own_end = sheet_end - overlap / 2 if sheet < count - 1 else roll_height
+        cut_lines = []
+        for (x1, y1), (x2, y2) in geometry.cut_lines:
+            low, high = sorted((roll_height - y1, roll_height - y2))
+            if low == high:
+                if own_start <= low < own_end or low == own_end == roll_height:
+                    cut_lines.append(((x1, y1 - top), (x2, y2 - top)))
+            elif low < own_end and high > own_start:
+                low, high = max(low, own_start), min(high, own_end)
+                cut_lines.append(((x1, roll_height - high - top), (x2, roll_height - low - top)))
+
+        # Registration crosses halfway through the overlaps with the previous and next sheet
+        marks = []
+        arm = MARK_SIZE_MM * scale / 2
+        mark_positions = []
+        if sheet > 0:
+            mark_positions.append(sheet_start + overlap / 2)
+        if sheet < count - 1:
+            mark_positions.append(sheet_end - overlap / 2)
+        for mark in mark_positions:
+            mark_y = roll_height - mark - top
+            for mark_x in (left_x - MARK_MARGIN_MM * scale, right_x + MARK_MARGIN_MM * scale):
+                marks.append(((mark_x - arm, mark_y), (mark_x + arm, mark_y)))
+                marks.append(((mark_x, mark_y - arm), (mark_x, mark_y + arm)))
+
+        yield geometry._replace(height=sheet_end - sheet_start, cut_lines=cut_lines, holes=tuple(holes)), marks
+
+
+def tile_file_name(filename, sheet):
+    base, extension = os.path.splitext(filename)
+    return f"{base}_sheet{sheet:02d}{extension}"
@@ -0,0 +1,56 @@
+import numpy as np
+
+# Reorders the holes before they are written, so the cutter doesn't travel the whole roll length for
+# every note. Holes are drawn row by row (note by note), which on a long roll means the head goes up
+# and down the roll once per note. Travel is measured between hole centres, pen up.
+
+NEAREST_WINDOW = 256  # How many holes ahead (along the roll) nearest neighbour ordering looks at
+
+
+def travel_distance(x, y):
+    """Total straight-line distance between consecutive points."""
+    return float(np.hypot(np.diff(x), np.diff(y)).sum())
+
+
+def serpentine_order(x, y, band_height):
+    """Cut the roll in bands across its width, sweeping left to right and right to left in turn."""
+    band = np.floor((y - y.min(initial=0)) / band_height).astype(np.int64)
+    direction = np.where(band % 2 == 0, 1, -1)
+    return np.lexsort((y, x * direction, band))
+
+
+def nearest_neighbour_order(x, y, window=NEAREST_WINDOW):
+    """Always go to the closest hole that hasn't been cut yet, looking at the next holes along the roll."""
+    by_y = np.argsort(y, kind="stable")
+    sorted_x, sorted_y = x[by_y], y[by_y]
+    done = np.zeros(len(x), dtype=bool)
+    order = np.empty(len(x), dtype=np.int64)
+    first = 0
+    current_x, current_y = (sorted_x[0], sorted_y[0]) if len(x) else (0, 0)
+    for i in range(len(x)):
+        while done[first]:
+            first += 1
+        candidates = first + np.flatnonzero(~done[first:first + window])
+        nearest = candidates[np.argmin(np.hypot(sorted_x[candidates] - current_x, sorted_y[candidates] - current_y))]
+        done[nearest] = True
+        order[i] = by_y[nearest]
+        current_x, current_y = sorted_x[nearest], sorted_y[nearest]
+    return order
+
+
+def order_holes(rects, method, band_height, scaling_factor):
+    """Reorder the (x, y, width, height, ...) hole arrays for the given method and print the travel saved."""
+    rect_x, rect_y, width, height = rects[:4]
+    centre_x, centre_y = rect_x + width / 2, rect_y + height / 2
+
+    if method == "serpentine":
+        order = serpentine_order(centre_x, centre_y, band_height)
+    elif method == "nearest":
+        order = nearest_neighbour_order(centre_x, centre_y)
+    else:
+        raise ValueError(f"Unknown toolpath order '{method}'")
+
+    before = travel_distance(centre_x, centre_y) / scaling_factor
+    after = travel_distance(centre_x[order], centre_y[order]) / scaling_factor
+    print(f"Toolpath travel between holes: {before / 1000:.1f} m before, {after / 1000:.1f} m after {method} ordering.")
+    return tuple(values[order] for values in rects)
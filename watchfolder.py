@@ -0,0 +1,165 @@
+import csv
+import json
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from functools import partial
+from batchconvert import find_midi_files, convert_quietly
+import parsecache
+
+# Keeps an eye on a folder and converts every MIDI file that is dropped into it, so nobody has to run
+# the scripts by hand for each file. The folder is checked every POLL_INTERVAL seconds; a file is
+# picked up once it has stopped changing between two checks (so files still being copied in are left
+# alone) and converted on a pool of worker processes. Files are told apart by their contents: a file
+# that was already converted with the same steps is skipped, even under another name, and a file
+# that changes is converted again. A file with the same contents as one that is still converting
+# waits for it: it is skipped if that one succeeds and converted itself if it fails. Results go to the
+# output folder, every file gets a line in the status log there, which is also read back at start-up
+# so restarting doesn't redo finished files.
+
+POLL_INTERVAL = 2  # Seconds between looking at the input folder
+STATUS_LOG_NAME = "watch_log.csv"  # Status log in the output folder
+STEPS = ("sustainadd", "checkoverlap", "piano", "organ")  # Everything the watcher can do, always run in this order
+DEFAULT_STEPS = ("piano",)
+
+
+def run_steps(midi_file, output_dir, steps):
+    """Run the steps on one file, writing into output_dir. Returns the output file names."""
+    import sustainadd
+    import checkoverlap
+    import multiroll
+    import rollengine
+
+    base_name = os.path.join(output_dir, os.path.splitext(os.path.basename(midi_file))[0])
+    outputs = []
+    if "sustainadd" in steps:
+        midi_file = sustainadd.add_sustain_note_with_controls(midi_file, base_name + sustainadd.OUTPUT_SUFFIX + ".mid")
+        outputs.append(midi_file)
+    if "checkoverlap" in steps:
+        report_file = base_name + "_overlaps.json"
+        with open(report_file, "w") as f:
+            json.dump(checkoverlap.overlap_report(midi_file), f, indent=2)
+        outputs.append(report_file)
+    profiles = [multiroll.PROFILES[step] for step in steps if step in multiroll.PROFILES]
+    if profiles:
+        outputs += rollengine.render_profiles(midi_file, profiles, multiroll.OPTIONS, multiroll.TIME_STEP, multiroll.USE_PARSE_CACHE, base_name=base_name)
+    return ", ".join(outputs)
+
+
+def read_status_log(log_file):
+    """(content hash, steps) -> file name for every file the log says was converted."""
+    done = {}
+    if os.path.exists(log_file):
+        with open(log_file, newline="") as f:
+            for row in csv.DictReader(f):
+                if row["status"] == "ok":
+                    done[row["content_hash"], row["steps"]] = row["midi_file"]
+    return done
+
+
+def log_status(log_file, midi_file, content_hash, steps, status, result, seconds=""):
+    new_log = not os.path.exists(log_file)
+    with open(log_file, "a", newline="") as f:
+        writer = csv.writer(f)
+        if new_log:
+            writer.writerow(["time", "midi_file", "content_hash", "steps", "status", "output_or_error", "seconds"])
+        writer.writerow([time.strftime("%Y-%m-%d %H:%M:%S"), midi_file, content_hash, steps, status, result, seconds])
+    print(f"{midi_file}: {status} {result}")
+
+
+def watch(input_dir, output_dir, steps=DEFAULT_STEPS, workers=None, interval=POLL_INTERVAL, once=False):
+    """Convert new and changed MIDI files in input_dir until stopped (or, with once, until it is empty)."""
+    os.makedirs(output_dir, exist_ok=True)
+    log_file = os.path.join(output_dir, STATUS_LOG_NAME)
+    steps = tuple(step for step in STEPS if step in steps)
+    step_names = "+".join(steps)
+    done = read_status_log(log_file)
+    convert = partial(run_steps, output_dir=output_dir, steps=steps)
+
+    last_seen = {}  # File -> (size, mtime) at the previous check
+    handled = {}  # File -> (size, mtime) it had when it was queued, held back or skipped
+    running = {}  # Future -> (file, content hash)
+    queued = {}  # Content hash -> file, while converting
+    waiting = {}  # Content hash -> [(file, (size, mtime))] with the same contents as the file converting
+
+    def start(midi_file, content_hash):
+        queued[content_hash] = midi_file
+        running[pool.submit(convert_quietly, convert, midi_file)] = (midi_file, content_hash)
+
+    print(f"Watching '{input_dir}' for MIDI files ({step_names}), results go to '{output_dir}'. Ctrl+C to stop.")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            while True:
+                for midi_file in find_midi_files(input_dir):
+                    try:
+                        stat = os.stat(midi_file)
+                    except OSError:
+                        continue  # Removed since the folder was listed
+                    stamp = (stat.st_size, stat.st_mtime_ns)
+                    stable = last_seen.get(midi_file) == stamp or once
+                    last_seen[midi_file] = stamp
+                    if not stable or handled.get(midi_file) == stamp:
+                        continue
+                    handled[midi_file] = stamp
+
+                    content_hash = parsecache.file_hash(midi_file)
+                    same_file = done.get((content_hash, step_names))
+                    if same_file:
+                        if same_file != midi_file:  # Nothing to log for a file that was simply done before
+                            log_status(log_file, midi_file, content_hash, step_names, "skipped", f"same contents as {same_file}")
+                    elif content_hash in queued:
+                        waiting.setdefault(content_hash, []).append((midi_file, stamp))
+                    else:
+                        start(midi_file, content_hash)
+
+                if not running:
+                    if once:
+                        return
+                    time.sleep(interval)
+                    continue
+
+                # Log whatever finished, waiting at most one poll interval
+                finished, _ = wait(running, timeout=None if once else interval, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    midi_file, content_hash = running.pop(future)
+                    del queued[content_hash]
+                    try:
+                        output, seconds = future.result()
+                        done[content_hash, step_names] = midi_file
+                        log_status(log_file, midi_file, content_hash, step_names, "ok", output, f"{seconds:.2f}")
+                    except Exception as e:
+                        log_status(log_file, midi_file, content_hash, step_names, "error", f"{type(e).__name__}: {e}")
+
+                    # Files that waited for this one, unless they changed in the meantime (then they were picked up again)
+                    held = [(held_file, stamp) for held_file, stamp in waiting.pop(content_hash, []) if handled.get(held_file) == stamp]
+                    if (content_hash, step_names) in done:
+                        for held_file, _ in held:
+                            if held_file != midi_file:
+                                log_status(log_file, held_file, content_hash, step_names, "skipped", f"same contents as {midi_file}")
+                    elif held:
+                        start(held[0][0], content_hash)  # Try again from the next copy, the rest keep waiting
+                        if held[1:]:
+                            waiting[content_hash] = held[1:]
+
+        except KeyboardInterrupt:
+            print(f"Stopping, {len(running)} conversions were still running.")
+            for future in running:
+                future.cancel()
+
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert every MIDI file that shows up in a folder.")
+    parser.add_argument("input_dir", help="folder to watch for .mid files")
+    parser.add_argument("output_dir", help="folder for the results and the status log")
+    parser.add_argument("--steps", nargs="+", choices=STEPS, default=list(DEFAULT_STEPS), help="what to do with every file, run in the order %(choices)s (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between checks of the folder (default: %(default)s)")
+    parser.add_argument("--once", action="store_true", help="convert what is in the folder now and stop")
+    args = parser.parse_args()
+    if os.path.abspath(args.input_dir) == os.path.abspath(args.output_dir):
+        sys.exit("The output folder has to be a different folder than the one being watched.")
+
+    watch(args.input_dir, args.output_dir, args.steps, args.workers, args.interval, args.once)